@@ -0,0 +1,307 @@
+"""
+Benchmark the heredity inference engines on synthetic pedigrees.
+
+Usage: python benchmark.py [--sizes 4 8 ...] [--output results.json]
+                            [--save DIRECTORY]
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import time
+import tracemalloc
+
+import numpy as np
+
+from heredity import (
+    PROBS,
+    Pedigree,
+    brute_force,
+    gibbs_sampling,
+    infer,
+    inheritance_table,
+    likelihood_weighting,
+    trait_table,
+    variable_elimination,
+)
+
+ENGINES = {
+    "brute-force": brute_force,
+    "variable-elimination": variable_elimination,
+    "families": infer,
+    "likelihood-weighting": lambda people: likelihood_weighting(people, seed=0)[0],
+    "gibbs": lambda people: gibbs_sampling(people, samples=2000, seed=0)[0],
+}
+SIZES = [4, 8, 16, 64, 256, 1024]
+SIBSHIPS = [100]
+BRUTE_FORCE_LIMIT = 8
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--observed", type=float, default=0.5)
+    parser.add_argument("--loops", type=int, nargs="+", default=[0, 2])
+    parser.add_argument(
+        "--sibships",
+        type=int,
+        nargs="*",
+        default=SIBSHIPS,
+        help="also run on one couple with each of these numbers of children",
+    )
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=list(ENGINES))
+    parser.add_argument(
+        "--brute-force-limit",
+        type=int,
+        default=BRUTE_FORCE_LIMIT,
+        help="largest pedigree to run the brute-force enumerator on",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--skip-memory",
+        action="store_true",
+        help="do not rerun each engine under tracemalloc to measure peak memory",
+    )
+    parser.add_argument("--output", help="write results to this file")
+    parser.add_argument(
+        "--save",
+        metavar="DIRECTORY",
+        help="also write each pedigree to a CSV file in this directory",
+    )
+    args = parser.parse_args()
+
+    if args.save:
+        os.makedirs(args.save, exist_ok=True)
+
+    results = []
+    for loops in args.loops:
+        for size in args.sizes:
+            pedigree = synthetic_pedigree(
+                size, args.depth, args.observed, loops, seed=args.seed
+            )
+            if args.save:
+                write_pedigree(
+                    pedigree, os.path.join(args.save, f"pedigree-{size}-{loops}.csv")
+                )
+            engines = [
+                engine
+                for engine in args.engines
+                if engine != "brute-force" or size <= args.brute_force_limit
+            ]
+            result = benchmark(pedigree, engines, memory=not args.skip_memory)
+            result.update(depth=args.depth, observed=args.observed, loops=loops)
+            results.append(result)
+    for children in args.sibships:
+        pedigree = sibship_pedigree(children, args.observed, seed=args.seed)
+        if args.save:
+            write_pedigree(pedigree, os.path.join(args.save, f"sibship-{children}.csv"))
+        engines = [
+            engine
+            for engine in args.engines
+            if engine != "brute-force" or len(pedigree) <= args.brute_force_limit
+        ]
+        result = benchmark(pedigree, engines, memory=not args.skip_memory)
+        result.update(observed=args.observed, children=children)
+        results.append(result)
+
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+def synthetic_pedigree(size, depth=3, observed=0.5, loops=0, seed=None):
+    """
+    Return a `Pedigree` of `size` people descended from one founding
+    couple over `depth` generations.
+
+    Each child has one parent from the previous generation and, usually,
+    a spouse who marries into the family. For the first `loops` children
+    from the third generation on, the spouse is instead a relative from
+    the previous generation, which closes a loop in the pedigree. Genes
+    and traits are sampled from `PROBS`, and each trait is kept as known
+    with probability `observed`.
+    """
+    rng = random.Random(seed)
+    mothers = []
+    fathers = []
+
+    def add(mother=-1, father=-1):
+        mothers.append(mother)
+        fathers.append(father)
+        return len(mothers) - 1
+
+    generation = [add(), add()]
+    for level in range(1, depth):
+        # Share the remaining places evenly between the remaining levels
+        budget = len(mothers) + (size - len(mothers)) // (depth - level)
+        children = []
+        while len(mothers) < budget:
+            parent = rng.choice(generation)
+            if loops and level >= 2 and len(generation) > 1:
+                spouse = rng.choice(
+                    [person for person in generation if person != parent]
+                )
+                loops -= 1
+            elif len(mothers) + 2 <= budget:
+                spouse = add()
+            else:
+                break
+            children.append(add(parent, spouse))
+        generation = children or generation
+
+    # Fill any remaining places with unrelated founders
+    while len(mothers) < size:
+        add()
+
+    return sample_pedigree(mothers, fathers, observed, rng)
+
+
+def sibship_pedigree(children, observed=0.5, seed=None):
+    """
+    Return a `Pedigree` of one couple and their `children`, whose shared
+    parents give variable elimination one cluster with a message from
+    every child.
+    """
+    rng = random.Random(seed)
+    mothers = [-1, -1] + [0] * children
+    fathers = [-1, -1] + [1] * children
+    return sample_pedigree(mothers, fathers, observed, rng)
+
+
+def sample_pedigree(mothers, fathers, observed, rng):
+    """
+    Return a `Pedigree` with the given parents, its genes and traits
+    sampled from `PROBS` using `rng`, and each trait kept as known with
+    probability `observed`.
+    """
+    size = len(mothers)
+
+    # Sample genes from parents to children, then traits from genes
+    genes = [0] * size
+    prior = [PROBS["gene"][gene] for gene in range(3)]
+    inheritance = inheritance_table()
+    traits = trait_table()
+    for i in range(size):
+        if mothers[i] < 0:
+            weights = prior
+        else:
+            weights = inheritance[genes[mothers[i]], genes[fathers[i]]]
+        genes[i] = rng.choices(range(3), weights)[0]
+    known = [
+        int(rng.random() < traits[genes[i], 1]) if rng.random() < observed else -1
+        for i in range(size)
+    ]
+
+    return Pedigree(
+        [f"person{i}" for i in range(size)],
+        np.array(mothers),
+        np.array(fathers),
+        np.array(known, dtype=np.int8),
+    )
+
+
+def write_pedigree(pedigree, filename):
+    """
+    Write `pedigree` to a CSV file that `load_data` can read.
+    """
+    names = pedigree.names
+    with open(filename, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["name", "mother", "father", "trait"])
+        for i, name in enumerate(names):
+            mother, father, trait = (
+                pedigree.mothers[i],
+                pedigree.fathers[i],
+                pedigree.traits[i],
+            )
+            writer.writerow(
+                [
+                    name,
+                    names[mother] if mother >= 0 else "",
+                    names[father] if father >= 0 else "",
+                    trait if trait >= 0 else "",
+                ]
+            )
+
+
+def max_difference(probabilities, reference):
+    """
+    Return the largest absolute difference between two sets of gene and
+    trait probabilities.
+    """
+    return max(
+        abs(probabilities[person][field][value] - reference[person][field][value])
+        for person in reference
+        for field in reference[person]
+        for value in reference[person][field]
+    )
+
+
+def measure(function, *args, memory=True):
+    """
+    Call `function` and return a tuple `(result, seconds, peak_bytes)`.
+
+    The peak traced memory is measured in a second call under tracemalloc,
+    so that tracing overhead does not distort the timing; it is None if
+    `memory` is false.
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    seconds = time.perf_counter() - start
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        function(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, seconds, peak
+
+
+def benchmark(pedigree, engines, memory=True):
+    """
+    Return a dictionary of timings and peak memory for each of `engines`
+    on `pedigree`, with each engine's largest difference from a reference.
+
+    The reference is the brute-force enumerator when it is among
+    `engines`, and variable elimination otherwise. An engine that runs out
+    of memory, as variable elimination can on a heavily looped pedigree,
+    is reported with the error instead; any other error is raised.
+    """
+    result = {"people": len(pedigree), "engines": dict()}
+    outputs = dict()
+    for engine in engines:
+        try:
+            outputs[engine], seconds, peak = measure(
+                ENGINES[engine], pedigree, memory=memory
+            )
+        except MemoryError as error:
+            result["engines"][engine] = {"error": f"MemoryError: {error}"}
+            continue
+        result["engines"][engine] = {"seconds": seconds, "peak_bytes": peak}
+
+    reference = next(
+        (
+            engine
+            for engine in ("brute-force", "variable-elimination")
+            if engine in outputs
+        ),
+        None,
+    )
+    result["reference"] = reference
+    for engine, probabilities in outputs.items():
+        if reference is not None:
+            result["engines"][engine]["max_error"] = max_difference(
+                probabilities, outputs[reference]
+            )
+    return result
+
+
+if __name__ == "__main__":
+    main()
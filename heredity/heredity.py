@@ -1,6 +1,13 @@
 import csv
+import heapq
 import itertools
+import multiprocessing
+import string
 import sys
+import time
+from array import array
+
+import numpy as np
 
 PROBS = {
     # Unconditional probabilities for having gene
@@ -17,45 +24,28 @@ PROBS = {
     "mutation": 0.01,
 }
 
+SAMPLES = 10000
+CHUNK = 4096
 
-def main():
+# Batches of families infer gives each worker process
+BATCHES_PER_WORKER = 4
 
-    # Check for proper usage
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python heredity.py data.csv")
-    people = load_data(sys.argv[1])
+# Most of a gibbs_sampling time budget spent on burn-in
+BURN_IN_FRACTION = 0.25
 
-    # Keep track of gene and trait probabilities for each person
-    probabilities = {
-        person: {"gene": {2: 0, 1: 0, 0: 0}, "trait": {True: 0, False: 0}}
-        for person in people
-    }
+# Most operands passed to one np.einsum call, within NumPy 1.x's limit of 32
+EINSUM_OPERANDS = 32
 
-    # Loop over all sets of people who might have the trait
-    names = set(people)
-    for have_trait in powerset(names):
 
-        # Check if current set of people violates known information
-        fails_evidence = any(
-            (
-                people[person]["trait"] is not None
-                and people[person]["trait"] != (person in have_trait)
-            )
-            for person in names
-        )
-        if fails_evidence:
-            continue
-
-        # Loop over all sets of people who might have the gene
-        for one_gene in powerset(names):
-            for two_genes in powerset(names - one_gene):
+def main():
 
-                # Update probabilities with new joint probability
-                p = joint_probability(people, one_gene, two_genes, have_trait)
-                update(probabilities, one_gene, two_genes, have_trait, p)
+    # Check for proper usage
+    if len(sys.argv) != 2:
+        sys.exit("Usage: python heredity.py data.csv")
+    people = load_pedigree(sys.argv[1])
 
-    # Ensure probabilities sum to 1
-    normalize(probabilities)
+    # Compute gene and trait probabilities for each person
+    probabilities = infer(people)
 
     # Print results
     for person in people:
@@ -67,6 +57,202 @@ def main():
                 print(f"    {value}: {p:.4f}")
 
 
+def infer(people, engine=None, workers=1):
+    """
+    Return gene and trait probabilities for each person in `people`,
+    computed separately for each family by `engine`, which defaults to
+    `variable_elimination`.
+
+    People in different families are independent, so each family is
+    solved on its own and the results are merged. This keeps the cost
+    additive across families, which matters for engines such as
+    `brute_force` whose cost grows exponentially with the people they
+    are given. Families are spread across `workers` processes in
+    `BATCHES_PER_WORKER` batches each.
+
+    Engines that also return diagnostics, such as `likelihood_weighting`
+    and `gibbs_sampling`, give a tuple `(probabilities, diagnostics)`
+    here too. Per-person diagnostics are merged across families, and
+    the others, such as the number of samples, become lists with one
+    entry per family.
+    """
+    engine = engine or variable_elimination
+    if workers == 1:
+        results = [engine(family) for family in families(people)]
+    else:
+        batches = family_batches(people, workers * BATCHES_PER_WORKER)
+        results = [
+            result
+            for batch in run_workers(
+                solve_families, [(engine, batch) for batch in batches], workers
+            )
+            for result in batch
+        ]
+    merged = dict()
+    diagnostics = None
+    for result in results:
+        if isinstance(result, tuple):
+            result, family_diagnostics = result
+            diagnostics = diagnostics or dict()
+            for key, value in family_diagnostics.items():
+                if isinstance(value, dict):
+                    diagnostics.setdefault(key, dict()).update(value)
+                else:
+                    diagnostics.setdefault(key, []).append(value)
+        merged.update(result)
+
+    probabilities = {name: merged[name] for name in people}
+    if diagnostics is None:
+        return probabilities
+    diagnostics = {
+        key: (
+            {name: value[name] for name in people} if isinstance(value, dict) else value
+        )
+        for key, value in diagnostics.items()
+    }
+    return probabilities, diagnostics
+
+
+def families(people):
+    """
+    Return a list splitting `people` into families of people connected
+    through mother and father links, in their original order. Each family
+    is a dictionary like `people`, or a `Pedigree` if `people` is one.
+    """
+    return [select(people, group) for group in family_groups(as_pedigree(people))]
+
+
+def family_batches(people, count):
+    """
+    Return a list of at most `count` batches of whole families in
+    `people`, with about as many people in each, in the same form as the
+    families returned by `families`.
+    """
+    groups = family_groups(as_pedigree(people))
+    size = -(-sum(len(group) for group in groups) // count)
+    batches = [[]]
+    for group in groups:
+        if len(batches[-1]) >= size:
+            batches.append([])
+        batches[-1].extend(group)
+    return [select(people, batch) for batch in batches]
+
+
+def solve_families(engine, people):
+    """
+    Return a list of the results of `engine` on each family in `people`.
+    """
+    return [engine(family) for family in families(people)]
+
+
+def select(people, indices):
+    """
+    Return the people at `indices` of `people`, which must include the
+    parents of everyone selected, as a dictionary or `Pedigree` like it.
+    """
+    if isinstance(people, Pedigree):
+        return people.subset(indices)
+    names = list(people)
+    return {names[i]: people[names[i]] for i in indices}
+
+
+def family_groups(pedigree):
+    """
+    Return a list of the indices of the people in each family of
+    `pedigree`, in their original order.
+    """
+    root = list(range(len(pedigree)))
+
+    def find(i):
+        while root[i] != i:
+            root[i] = root[root[i]]
+            i = root[i]
+        return i
+
+    for i, (mother, father) in enumerate(
+        zip(pedigree.mothers.tolist(), pedigree.fathers.tolist())
+    ):
+        for parent in (mother, father):
+            if parent >= 0:
+                root[find(parent)] = find(i)
+
+    groups = dict()
+    for i in range(len(pedigree)):
+        groups.setdefault(find(i), []).append(i)
+    return list(groups.values())
+
+
+def brute_force(people, chunk=CHUNK):
+    """
+    Return gene and trait probabilities for each person in `people` by
+    summing the joint probability of every possible assignment of genes
+    and traits that is consistent with the known traits.
+
+    Assignments are streamed from `consistent_assignments` in chunks of
+    `chunk`, scored in log space so long products cannot underflow, and
+    accumulated relative to the largest log probability seen so far.
+    """
+    model = Model(people)
+    n = len(model.names)
+    log_scale = -np.inf
+    gene_totals = np.zeros((n, 3))
+    trait_totals = np.zeros((n, 2))
+
+    assignments = consistent_assignments(model)
+    while batch := list(itertools.islice(assignments, chunk)):
+        genes, traits = (np.array(column) for column in zip(*batch))
+        log_p = model.log_probabilities(genes, traits)
+
+        # Rescale the running totals if this chunk holds a larger term
+        top = log_p.max()
+        if top > log_scale:
+            gene_totals *= np.exp(log_scale - top)
+            trait_totals *= np.exp(log_scale - top)
+            log_scale = top
+        p = np.exp(log_p - log_scale)
+
+        gene_totals += (
+            p @ (genes[:, :, np.newaxis] == np.arange(3)).reshape(len(p), -1)
+        ).reshape(n, 3)
+        trait_totals += (
+            p @ (traits[:, :, np.newaxis] == np.arange(2)).reshape(len(p), -1)
+        ).reshape(n, 2)
+
+    # Ensure probabilities sum to 1
+    gene_totals /= gene_totals.sum(axis=1, keepdims=True)
+    trait_totals /= trait_totals.sum(axis=1, keepdims=True)
+    return {
+        name: {
+            "gene": {gene: float(gene_totals[i][gene]) for gene in (2, 1, 0)},
+            "trait": {
+                True: float(trait_totals[i][1]),
+                False: float(trait_totals[i][0]),
+            },
+        }
+        for i, name in enumerate(model.names)
+    }
+
+
+def consistent_assignments(model):
+    """
+    Generate every assignment of genes and traits to the people of `model`
+    that agrees with their known traits, as a pair of tuples giving each
+    person's number of copies of the gene and trait (1 or 0) by index.
+
+    Known traits are fixed up front, so only the unknown ones are
+    enumerated and no assignment contradicting the evidence is produced.
+    """
+    n = len(model.names)
+    traits = model.observed.tolist()
+    unknown = [i for i, trait in enumerate(traits) if trait < 0]
+    for unknown_traits in itertools.product((0, 1), repeat=len(unknown)):
+        for i, trait in zip(unknown, unknown_traits):
+            traits[i] = trait
+        assignment_traits = tuple(traits)
+        for genes in itertools.product((0, 1, 2), repeat=n):
+            yield genes, assignment_traits
+
+
 def load_data(filename):
     """
     Load gene and trait data from a file into a dictionary.
@@ -92,6 +278,164 @@ def load_data(filename):
     return data
 
 
+def load_pedigree(filename):
+    """
+    Load gene and trait data from a file into a `Pedigree`, in the same
+    format as `load_data`, reading one row at a time.
+
+    Names are interned to integer indices as they are first seen, whether
+    as a person or a parent, so parent references are checked in the same
+    pass. Raise ValueError for repeated names, people with only one
+    parent, and parents missing from the file.
+    """
+    index = dict()
+    names = []
+    defined = array("b")
+    rows = array("q")
+    mothers = array("q")
+    fathers = array("q")
+    traits = array("b")
+
+    def intern(name):
+        if name not in index:
+            index[name] = len(names)
+            names.append(name)
+            defined.append(0)
+        return index[name]
+
+    with open(filename, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        columns = [header.index(field) for field in ("name", "mother", "father")]
+        trait_column = header.index("trait")
+        for row in reader:
+
+            # Like `DictReader`, skip blank lines and treat missing
+            # trailing fields as blank
+            if not row:
+                continue
+            row += [""] * (len(header) - len(row))
+            name, mother, father = (row[column] for column in columns)
+            i = intern(name)
+            if defined[i]:
+                raise ValueError(f"{name} appears more than once")
+            if bool(mother) != bool(father):
+                raise ValueError(f"{name} must have both parents or neither")
+            defined[i] = 1
+            rows.append(i)
+            mothers.append(intern(mother) if mother else -1)
+            fathers.append(intern(father) if father else -1)
+            trait = row[trait_column]
+            traits.append(1 if trait == "1" else 0 if trait == "0" else -1)
+
+    if len(rows) != len(names):
+        missing = next(name for i, name in enumerate(names) if not defined[i])
+        raise ValueError(f"parent {missing} is not in the file")
+
+    # Renumber people in file order
+    position = np.empty(len(names), dtype=np.int64)
+    position[np.asarray(rows)] = np.arange(len(rows))
+    mothers = np.asarray(mothers)
+    fathers = np.asarray(fathers)
+    return Pedigree(
+        [names[i] for i in rows],
+        np.where(mothers >= 0, position[mothers], -1),
+        np.where(fathers >= 0, position[fathers], -1),
+        np.asarray(traits),
+    )
+
+
+class Pedigree:
+    """
+    Column-oriented set of people, indexed by integer.
+
+    `names` lists each person's name, `mothers` and `fathers` are arrays
+    of parent indices, or -1 for people without parents, and `traits`
+    holds 1 or 0 for known traits and -1 otherwise. Iterating over a
+    pedigree yields names, and the inference functions accept a pedigree
+    anywhere they accept the output of `load_data`.
+    """
+
+    def __init__(self, names, mothers, fathers, traits):
+        self.names = names
+        self.mothers = mothers
+        self.fathers = fathers
+        self.traits = traits
+
+    @classmethod
+    def from_people(cls, people):
+        """
+        Return a pedigree holding the people loaded by `load_data`.
+        """
+        index = {name: i for i, name in enumerate(people)}
+        mothers = np.full(len(people), -1)
+        fathers = np.full(len(people), -1)
+        traits = np.full(len(people), -1, dtype=np.int8)
+        for i, person in enumerate(people.values()):
+            if person["mother"] is not None:
+                mothers[i] = index[person["mother"]]
+                fathers[i] = index[person["father"]]
+            if person["trait"] is not None:
+                traits[i] = int(person["trait"])
+        return cls(list(people), mothers, fathers, traits)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def subset(self, indices):
+        """
+        Return a pedigree of the people at `indices`, which must include
+        the parents of everyone in it.
+        """
+        indices = list(indices)
+        position = {i: k for k, i in enumerate(indices)}
+        position[-1] = -1
+        return Pedigree(
+            [self.names[i] for i in indices],
+            np.array([position[i] for i in self.mothers[indices].tolist()]),
+            np.array([position[i] for i in self.fathers[indices].tolist()]),
+            self.traits[indices],
+        )
+
+    def order(self):
+        """
+        Return an array listing every index after the indices of that
+        person's parents.
+        """
+        mothers = self.mothers.tolist()
+        fathers = self.fathers.tolist()
+
+        # Visit each person once both of their parents have been visited
+        waiting = [
+            int(mother >= 0) + int(father >= 0)
+            for mother, father in zip(mothers, fathers)
+        ]
+        children = [[] for _ in mothers]
+        for i, (mother, father) in enumerate(zip(mothers, fathers)):
+            if mother >= 0:
+                children[mother].append(i)
+                children[father].append(i)
+        order = [i for i in range(len(mothers)) if not waiting[i]]
+        for i in order:
+            for child in children[i]:
+                waiting[child] -= 1
+                if not waiting[child]:
+                    order.append(child)
+        return np.array(order, dtype=np.int64)
+
+
+def as_pedigree(people):
+    """
+    Return `people` as a `Pedigree`, converting the output of `load_data`.
+    """
+    if isinstance(people, Pedigree):
+        return people
+    return Pedigree.from_people(people)
+
+
 def powerset(s):
     """
     Return a list of all possible subsets of set s.
@@ -146,55 +490,316 @@ def joint_probability(people, one_gene, two_genes, have_trait):
 
     """
 
-    probability = 1
+    model = Model(people)
+    return model.probability(*model.assignment(one_gene, two_genes, have_trait))
 
-    for person in people:
-        # determine the number of genes the person has
-        genes = 2 if person in two_genes else 1 if person in one_gene else 0
 
-        # determine if the person has the trait
-        trait = person in have_trait
+def inheritance_table(probs=PROBS):
+    """
+    Return a 3x3x3 array whose entry `[mother, father, child]` is the
+    probability of a child having `child` copies of the gene, given how
+    many copies each parent has.
+    """
+    mutation = probs["mutation"]
 
-        if people[person]["mother"] is None:
-            # if the person has no parents, use the unconditional probability
-            gene_prob = PROBS["gene"][genes]
-        else:
-            # otherwise, calculate the probability based on the parents genes
-            mother = people[person]["mother"]
-            father = people[person]["father"]
-
-            # calculate the probability of inheriting the gene from each parent
-            passing_prob = {
-                mother: (
-                    1 - PROBS["mutation"]
-                    if mother in two_genes
-                    else 0.5 if mother in one_gene else PROBS["mutation"]
-                ),
-                father: (
-                    1 - PROBS["mutation"]
-                    if father in two_genes
-                    else 0.5 if father in one_gene else PROBS["mutation"]
-                ),
-            }
+    # Probability of a parent passing on the gene, by their copies of it
+    passing = np.array([mutation, 0.5, 1 - mutation])
+    mother = passing[:, np.newaxis]
+    father = passing[np.newaxis, :]
+
+    table = np.empty((3, 3, 3))
+    table[:, :, 0] = (1 - mother) * (1 - father)
+    table[:, :, 1] = mother * (1 - father) + (1 - mother) * father
+    table[:, :, 2] = mother * father
+    return table
 
-            if genes == 2:
-                # if the person has two genes, calculate the probability they inherited one from each parent
-                gene_prob = passing_prob[mother] * passing_prob[father]
-            elif genes == 1:
-                # if the person has one gene, calculate the probability they inherited the gene from one parent, but not the other
-                gene_prob = (
-                    passing_prob[mother] * (1 - passing_prob[father])
-                    + (1 - passing_prob[mother]) * passing_prob[father]
-                )
+
+def trait_table(probs=PROBS):
+    """
+    Return a 3x2 array whose entry `[gene, trait]` is the probability of
+    having the trait (`trait` 1) or not (`trait` 0) given `gene` copies.
+    """
+    return np.array(
+        [[probs["trait"][gene][False], probs["trait"][gene][True]] for gene in range(3)]
+    )
+
+
+class Model:
+    """
+    Heredity model for a fixed set of people, compiled for fast scoring.
+
+    People are numbered in dictionary order, with their parents and known
+    traits held as index arrays. The inheritance and trait probabilities
+    from `probs` are flattened into lookup tables, so scoring a full
+    assignment of genes and traits is one table lookup per person.
+    """
+
+    def __init__(self, people, probs=PROBS):
+        self.names = list(people)
+        self.mothers, self.fathers, self.observed, self.order = pedigree_arrays(people)
+
+        # Flat tables: prior[gene], inheritance[9 * mother + 3 * father + child]
+        # and trait[2 * gene + trait]
+        self.prior = np.array([probs["gene"][gene] for gene in range(3)])
+        self.inheritance = inheritance_table(probs).ravel()
+        self.trait = trait_table(probs).ravel()
+
+        # Plain lists are faster than arrays for scoring one assignment
+        self._parents = list(zip(self.mothers.tolist(), self.fathers.tolist()))
+        self._prior = self.prior.tolist()
+        self._inheritance = self.inheritance.tolist()
+        self._trait = self.trait.tolist()
+
+    def assignment(self, one_gene, two_genes, have_trait):
+        """
+        Return the lists `(genes, traits)` giving each person's number of
+        copies of the gene and whether they have the trait (1) or not (0),
+        by index, for the sets of names taken by `joint_probability`.
+        """
+        genes = [
+            2 if name in two_genes else 1 if name in one_gene else 0
+            for name in self.names
+        ]
+        traits = [int(name in have_trait) for name in self.names]
+        return genes, traits
+
+    def probability(self, genes, traits):
+        """
+        Return the joint probability of one assignment of `genes` and
+        `traits`, given as sequences indexed by person.
+        """
+        probability = 1
+        for i, (mother, father) in enumerate(self._parents):
+            gene = genes[i]
+            if mother < 0:
+                probability *= self._prior[gene]
             else:
-                # otherwise, its the probability of getting no genes from both parents
-                gene_prob = (1 - passing_prob[mother]) * (1 - passing_prob[father])
+                probability *= self._inheritance[
+                    9 * genes[mother] + 3 * genes[father] + gene
+                ]
+            probability *= self._trait[2 * gene + traits[i]]
+        return probability
+
+    def log_probabilities(self, genes, traits):
+        """
+        Return the natural logarithms of the joint probabilities of a batch
+        of assignments, given as for `probabilities`.
+        """
+        founders = self.mothers < 0
+        with np.errstate(divide="ignore"):
+            log_prior = np.log(self.prior)
+            log_inheritance = np.log(self.inheritance)
+            log_trait = np.log(self.trait)
+        inherited = log_inheritance[
+            9 * genes[:, self.mothers] + 3 * genes[:, self.fathers] + genes
+        ]
+        log_genes = np.where(founders, log_prior[genes], inherited)
+        return (log_genes + log_trait[2 * genes + traits]).sum(axis=1)
 
-        # calculate the probability of the person having the trait given their genes
-        trait_prob = PROBS["trait"][genes][trait]
-        probability *= gene_prob * trait_prob
+    def probabilities(self, genes, traits):
+        """
+        Return the joint probabilities of a batch of assignments, given as
+        arrays of `genes` and `traits` with one row per assignment, using
+        one gather from the flat tables per array and one product.
+        """
+        founders = self.mothers < 0
+        inherited = self.inheritance[
+            9 * genes[:, self.mothers] + 3 * genes[:, self.fathers] + genes
+        ]
+        gene_probabilities = np.where(founders, self.prior[genes], inherited)
+        trait_probabilities = self.trait[2 * genes + traits]
+        return (gene_probabilities * trait_probabilities).prod(axis=1)
 
-    return probability
+
+def variable_elimination(people):
+    """
+    Return gene and trait probabilities for each person in `people`, in the
+    same form as `brute_force`, computed exactly by variable elimination.
+
+    Each person contributes one factor over their own gene and their
+    parents' genes, weighted by the probability of their trait if it is
+    known. The genes are eliminated in a greedy min-fill order, and the
+    messages of that elimination form a junction tree, so a second pass
+    back down the tree yields every person's marginal at once. The cost
+    grows linearly with the number of people on tree-like pedigrees.
+    """
+    mothers, fathers, observed, _ = pedigree_arrays(people)
+    prior = np.array([PROBS["gene"][gene] for gene in range(3)])
+    inheritance = inheritance_table()
+    traits = trait_table()
+
+    factors = []
+    for i in range(len(mothers)):
+        if observed[i] < 0:
+            likelihood = np.ones(3)
+        else:
+            likelihood = traits[:, observed[i]]
+        if mothers[i] < 0:
+            factors.append(((i,), prior * likelihood))
+        else:
+            factors.append(((mothers[i], fathers[i], i), inheritance * likelihood))
+
+    genes = junction_tree_marginals(factors, len(mothers))
+
+    return to_probabilities(people, genes)
+
+
+def junction_tree_marginals(factors, n):
+    """
+    Return an n x 3 array of the normalized marginal distribution of each
+    of the variables `0` to `n - 1`, each taking values 0, 1 and 2, given
+    `factors` as a list of `(scope, table)` pairs.
+
+    Eliminating the variables in turn creates one cluster per variable.
+    Each cluster's message is consumed by the cluster of the first of its
+    remaining variables to be eliminated, which makes the clusters a
+    junction tree. Messages passed up during elimination and back down
+    afterwards give every cluster its full belief.
+    """
+    order = elimination_order([scope for scope, _ in factors], n)
+    step = {variable: k for k, variable in enumerate(order)}
+
+    # Assign each factor to the cluster of its first variable eliminated
+    own = [[] for _ in range(n)]
+    for factor in factors:
+        own[min(step[variable] for variable in factor[0])].append(factor)
+
+    # Upward pass, which is plain variable elimination
+    up = [None] * n
+    children = [[] for _ in range(n)]
+    for k, variable in enumerate(order):
+        incoming = own[k] + [up[child] for child in children[k]]
+        scope = {v for factor_scope, _ in incoming for v in factor_scope}
+        scope = tuple(sorted(scope - {variable}))
+        if scope:
+            up[k] = (scope, contract(incoming, scope))
+            children[min(step[v] for v in scope)].append(k)
+
+    # Downward pass, from the last cluster eliminated back to the first
+    down = [None] * n
+    marginals = np.empty((n, 3))
+    for k in reversed(range(n)):
+        context = own[k] + ([down[k]] if down[k] is not None else [])
+        incoming = [up[child] for child in children[k]]
+        marginals[order[k]] = contract(context + incoming, (order[k],))
+
+        # Each child's message leaves out its own, so the products of the
+        # messages before and after it are built up once for all children
+        scope = tuple(
+            sorted({v for message_scope, _ in incoming for v in message_scope})
+        )
+        before = [[]]
+        for message in incoming[:-1]:
+            before.append([(scope, contract(before[-1] + [message], scope))])
+        after = [[]]
+        for message in reversed(incoming[1:]):
+            after.append([(scope, contract([message] + after[-1], scope))])
+        after.reverse()
+        for i, child in enumerate(children[k]):
+            others = before[i] + after[i]
+            down[child] = (up[child][0], contract(context + others, up[child][0]))
+
+    return marginals
+
+
+def contract(factors, scope):
+    """
+    Return the product of `factors`, summed over every variable not in
+    `scope` and normalized to sum to 1, as a table over `scope`.
+
+    Clusters with more than `EINSUM_OPERANDS` factors, such as a couple
+    with many children, are multiplied together in batches first.
+    """
+    variables = {variable for factor_scope, _ in factors for variable in factor_scope}
+
+    # A variable no factor mentions is unconstrained
+    factors = factors + [((v,), np.ones(3)) for v in scope if v not in variables]
+    letters = {
+        variable: string.ascii_letters[i]
+        for i, variable in enumerate(variables.union(scope))
+    }
+
+    def product(factors, scope):
+        inputs = ",".join(
+            "".join(letters[variable] for variable in factor_scope)
+            for factor_scope, _ in factors
+        )
+        output = "".join(letters[variable] for variable in scope)
+        table = np.einsum(f"{inputs}->{output}", *[table for _, table in factors])
+        return table / table.sum()
+
+    while len(factors) > EINSUM_OPERANDS:
+        batch = factors[:EINSUM_OPERANDS]
+        batch_scope = tuple({v for factor_scope, _ in batch for v in factor_scope})
+        factors = factors[EINSUM_OPERANDS:] + [
+            (batch_scope, product(batch, batch_scope))
+        ]
+    return product(factors, scope)
+
+
+def elimination_order(scopes, n):
+    """
+    Return an order in which to eliminate the variables `0` to `n - 1` of
+    factors with the given `scopes`, chosen greedily to add the fewest
+    new edges between the remaining variables at each step (min-fill),
+    with ties broken by the fewest neighbours.
+    """
+    neighbours = [set() for _ in range(n)]
+    for scope in scopes:
+        for variable in scope:
+            neighbours[variable].update(scope)
+    for variable in range(n):
+        neighbours[variable].discard(variable)
+
+    def cost(variable):
+        fill = sum(
+            1
+            for a, b in itertools.combinations(neighbours[variable], 2)
+            if b not in neighbours[a]
+        )
+        return (fill, len(neighbours[variable]))
+
+    costs = [cost(variable) for variable in range(n)]
+    heap = [(costs[variable], variable) for variable in range(n)]
+    heapq.heapify(heap)
+
+    order = []
+    eliminated = [False] * n
+    while heap:
+        variable_cost, variable = heapq.heappop(heap)
+        if eliminated[variable] or variable_cost != costs[variable]:
+            continue
+        eliminated[variable] = True
+        order.append(variable)
+
+        # Connect the eliminated variable's neighbours to each other
+        remaining = neighbours[variable]
+        filled = variable_cost[0] > 0
+        for neighbour in remaining:
+            neighbours[neighbour].discard(variable)
+            neighbours[neighbour].update(remaining - {neighbour})
+
+        # Without new edges, each neighbour's fill only loses the missing
+        # edges to the eliminated variable, which saves recounting it for
+        # the parents of a large sibship after every child
+        if not filled:
+            for neighbour in remaining:
+                fill, degree = costs[neighbour]
+                missing = len(neighbours[neighbour] - remaining)
+                costs[neighbour] = (fill - missing, degree - 1)
+                heapq.heappush(heap, (costs[neighbour], neighbour))
+            continue
+
+        # Only variables within two steps can have changed cost
+        affected = set(remaining)
+        for neighbour in remaining:
+            affected.update(neighbours[neighbour])
+        for other in affected:
+            if not eliminated[other]:
+                costs[other] = cost(other)
+                heapq.heappush(heap, (costs[other], other))
+
+    return order
 
 
 def update(probabilities, one_gene, two_genes, have_trait, p):
@@ -234,5 +839,337 @@ def normalize(probabilities):
             probabilities[person]["trait"][trait] /= trait_total
 
 
+def to_probabilities(people, genes):
+    """
+    Return gene and trait probabilities for each person in `people`, in the
+    same form as `brute_force`, given an array whose row `i` holds the gene
+    distribution of the `i`-th person.
+
+    A known trait is certain; otherwise the trait distribution follows
+    from the person's gene distribution.
+    """
+    traits = trait_table()
+    observed = as_pedigree(people).traits
+    probabilities = dict()
+    for i, name in enumerate(people):
+        if observed[i] < 0:
+            no_trait, has_trait = genes[i] @ traits
+        else:
+            no_trait, has_trait = 1.0 - observed[i], float(observed[i])
+        probabilities[name] = {
+            "gene": {gene: float(genes[i][gene]) for gene in (2, 1, 0)},
+            "trait": {True: float(has_trait), False: float(no_trait)},
+        }
+    return probabilities
+
+
+def pedigree_arrays(people):
+    """
+    Return a tuple `(mothers, fathers, traits, order)` of arrays describing
+    `people` by integer index, as held by `Pedigree`, where `order` lists
+    every index after the indices of that person's parents.
+    """
+    pedigree = as_pedigree(people)
+    return pedigree.mothers, pedigree.fathers, pedigree.traits, pedigree.order()
+
+
+def likelihood_weighting(people, samples=SAMPLES, seconds=None, workers=1, seed=None):
+    """
+    Return approximate gene and trait probabilities for each person in
+    `people`, estimated by likelihood weighting, and a dictionary of
+    diagnostics.
+
+    Genes are sampled from parents to children, and each sample is
+    weighted by the probability of the known traits given its genes.
+    Sampling stops once `samples` samples have been drawn or `seconds`
+    have passed, whichever comes first, and is split between `workers`
+    processes seeded from `seed`.
+
+    The diagnostics hold the number of `samples` drawn, the
+    `effective_samples` given the spread of the weights, and the
+    standard error (`stderr`) of each gene probability.
+    """
+    if samples is None and seconds is None:
+        raise ValueError("need a sample or time budget")
+    shards = split_budget(samples, workers)
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    arguments = [
+        (pedigree_arrays(people), shard, seconds, seeds[i])
+        for i, shard in enumerate(shards)
+    ]
+    results = run_workers(weight_samples, arguments, workers)
+
+    # Bring each worker's sums to a common scale before merging them
+    shift = max(result[0] for result in results)
+    count, weights, squares, genes, gene_squares = 0, 0, 0, 0, 0
+    for log_scale, n, total, total_squares, gene_total, gene_total_squares in results:
+        scale = np.exp(log_scale - shift)
+        count += n
+        weights += total * scale
+        squares += total_squares * scale**2
+        genes = genes + gene_total * scale
+        gene_squares = gene_squares + gene_total_squares * scale**2
+
+    # Standard error of a self-normalized importance sampling estimate
+    estimate = genes / weights
+    variance = gene_squares * (1 - 2 * estimate) + estimate**2 * squares
+    stderr = np.sqrt(np.maximum(variance, 0)) / weights
+
+    diagnostics = {
+        "samples": count,
+        "effective_samples": float(weights**2 / squares),
+        "stderr": gene_diagnostics(people, stderr),
+    }
+    return to_probabilities(people, estimate), diagnostics
+
+
+def weight_samples(pedigree, samples, seconds, seed):
+    """
+    Draw up to `samples` likelihood-weighted samples of the genes of the
+    pedigree described by `pedigree_arrays`, stopping after `seconds` if
+    given, and return a tuple of weight sums for `likelihood_weighting`.
+
+    Weights are tracked in log space and accumulated relative to the
+    largest log weight seen, returned first, so that long products of
+    trait probabilities cannot underflow.
+    """
+    mothers, fathers, traits, order = pedigree
+    n = len(order)
+    rng = np.random.default_rng(seed)
+    deadline = None if seconds is None else time.perf_counter() + seconds
+    prior = np.cumsum([PROBS["gene"][gene] for gene in range(3)])
+    inheritance = np.cumsum(inheritance_table(), axis=2)
+    log_traits = np.log(trait_table())
+
+    log_scale = -np.inf
+    count, weights, squares = 0, 0.0, 0.0
+    genes = np.zeros((n, 3))
+    gene_squares = np.zeros((n, 3))
+    batch_size = max(16, 2**20 // max(n, 1))
+    while samples is None or count < samples:
+        if deadline is not None and time.perf_counter() > deadline:
+            break
+        batch = batch_size if samples is None else min(batch_size, samples - count)
+
+        # Sample each gene from the inheritance table once the parents'
+        # genes are known, and weight by the probability of known traits
+        sample = np.zeros((batch, n), dtype=np.intp)
+        log_weights = np.zeros(batch)
+        for i in order:
+            if mothers[i] < 0:
+                cumulative = prior
+            else:
+                cumulative = inheritance[sample[:, mothers[i]], sample[:, fathers[i]]]
+            draws = rng.random((batch, 1))
+            sample[:, i] = (draws > cumulative[..., :2]).sum(axis=-1)
+            if traits[i] >= 0:
+                log_weights += log_traits[sample[:, i], traits[i]]
+
+        # Rescale the running sums if this batch holds a larger weight
+        top = log_weights.max()
+        if top > log_scale:
+            weights *= np.exp(log_scale - top)
+            squares *= np.exp(2 * (log_scale - top))
+            genes *= np.exp(log_scale - top)
+            gene_squares *= np.exp(2 * (log_scale - top))
+            log_scale = top
+        weight = np.exp(log_weights - log_scale)
+
+        one_hot = (sample[:, :, np.newaxis] == np.arange(3)).reshape(batch, -1)
+        count += batch
+        weights += weight.sum()
+        squares += (weight**2).sum()
+        genes += (weight @ one_hot).reshape(n, 3)
+        gene_squares += (weight**2 @ one_hot).reshape(n, 3)
+
+    return log_scale, count, weights, squares, genes, gene_squares
+
+
+def gibbs_sampling(
+    people,
+    samples=SAMPLES,
+    seconds=None,
+    chains=4,
+    burn_in=100,
+    workers=1,
+    seed=None,
+):
+    """
+    Return approximate gene and trait probabilities for each person in
+    `people`, estimated by Gibbs sampling, and a dictionary of diagnostics.
+
+    Each of `chains` chains repeatedly resamples every person's gene given
+    the genes of their parents, children and co-parents and their known
+    trait. After `burn_in` sweeps, or `BURN_IN_FRACTION` of `seconds` if
+    that comes first, the conditional distribution used for each update is
+    averaged into the estimate. Sampling stops once about `samples` sweeps
+    have been kept across all chains or `seconds` have passed, whichever
+    comes first, though at least one sweep is always kept. The chains are
+    split between `workers` processes seeded from `seed`.
+
+    The diagnostics hold the number of `samples` kept, the fewest sweeps
+    any chain spent on burn-in (`burn_in`), the standard error
+    (`stderr`) of each gene probability, and its potential scale reduction
+    factor (`rhat`) across chains, which approaches 1 as chains converge.
+    Both need at least two chains to account for correlation between
+    sweeps; `rhat` is NaN with a single chain.
+    """
+    if chains < workers:
+        raise ValueError("need at least one chain per worker")
+    if samples is None and seconds is None:
+        raise ValueError("need a sample or time budget")
+    sweeps = None if samples is None else -(-samples // chains)
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    arguments = [
+        (pedigree_arrays(people), crew, sweeps, seconds, burn_in, seeds[i])
+        for i, crew in enumerate(split_budget(chains, workers))
+    ]
+    results = run_workers(gibbs_chains, arguments, workers)
+
+    counts = np.concatenate([result[0] for result in results])
+    totals = np.concatenate([result[1] for result in results])
+    squares = np.concatenate([result[2] for result in results])
+
+    # Compare the spread within and between chains for every marginal
+    count = counts[:, np.newaxis, np.newaxis]
+    means = totals / count
+    within = ((squares - count * means**2) / np.maximum(count - 1, 1)).mean(axis=0)
+    estimate = totals.sum(axis=0) / counts.sum()
+    sweeps = counts.mean()
+    if len(counts) > 1:
+        # Successive sweeps are correlated, so the standard error comes
+        # from how far the chain averages disagree with each other
+        between = sweeps * means.var(axis=0, ddof=1)
+        stderr = np.sqrt(means.var(axis=0, ddof=1) / len(counts))
+        pooled = (sweeps - 1) / sweeps * within + between / sweeps
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rhat = np.where(within > 0, np.sqrt(pooled / within), 1.0)
+    else:
+        stderr = np.sqrt(within / counts.sum())
+        rhat = np.full(estimate.shape, np.nan)
+
+    diagnostics = {
+        "samples": int(counts.sum()),
+        "burn_in": min(result[3] for result in results),
+        "stderr": gene_diagnostics(people, stderr),
+        "rhat": gene_diagnostics(people, rhat),
+    }
+    return to_probabilities(people, estimate), diagnostics
+
+
+def gibbs_chains(pedigree, chains, sweeps, seconds, burn_in, seed):
+    """
+    Run `chains` Gibbs chains over the pedigree described by
+    `pedigree_arrays` for `burn_in` sweeps and then up to `sweeps` more,
+    stopping after `seconds` if given. Burn-in ends early once it has
+    taken `BURN_IN_FRACTION` of `seconds`, and the deadline only stops the
+    chains after they have kept a sweep.
+
+    Return a tuple holding, for every chain, the number of sweeps kept
+    and the sum and sum of squares of each person's conditional gene
+    distribution over those sweeps, and the number of burn-in sweeps.
+    """
+    mothers, fathers, traits, order = pedigree
+    n = len(order)
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+    deadline = None if seconds is None else start + seconds
+    burn_in_deadline = None if seconds is None else start + BURN_IN_FRACTION * seconds
+    log_prior = np.log([PROBS["gene"][gene] for gene in range(3)])
+    log_inheritance = np.log(inheritance_table())
+    log_traits = np.log(trait_table())
+
+    children = [[] for _ in range(n)]
+    for i in range(n):
+        if mothers[i] >= 0:
+            children[mothers[i]].append(i)
+            children[fathers[i]].append(i)
+
+    # Start every chain from a sample of the genes without evidence
+    state = np.zeros((chains, n), dtype=np.intp)
+    for i in order:
+        if mothers[i] < 0:
+            cumulative = np.exp(log_prior).cumsum()
+        else:
+            cumulative = np.exp(
+                log_inheritance[state[:, mothers[i]], state[:, fathers[i]]]
+            )
+            cumulative = cumulative.cumsum(axis=-1)
+        state[:, i] = (rng.random((chains, 1)) > cumulative[..., :2]).sum(axis=-1)
+
+    counts = np.zeros(chains, dtype=np.int64)
+    totals = np.zeros((chains, n, 3))
+    squares = np.zeros((chains, n, 3))
+    sweep = 0
+    burning = burn_in > 0
+    while sweeps is None or counts[0] < sweeps:
+        if counts[0] and deadline is not None and time.perf_counter() > deadline:
+            break
+        for i in order:
+            if mothers[i] < 0:
+                log_p = np.broadcast_to(log_prior, (chains, 3))
+            else:
+                log_p = log_inheritance[state[:, mothers[i]], state[:, fathers[i]]]
+            if traits[i] >= 0:
+                log_p = log_p + log_traits[:, traits[i]]
+            for child in children[i]:
+                mother, father = state[:, mothers[child]], state[:, fathers[child]]
+                if mothers[child] == i:
+                    log_p = log_p + log_inheritance[:, father, state[:, child]].T
+                else:
+                    log_p = log_p + log_inheritance[mother, :, state[:, child]]
+
+            p = np.exp(log_p - log_p.max(axis=1, keepdims=True))
+            p /= p.sum(axis=1, keepdims=True)
+            draws = rng.random((chains, 1))
+            state[:, i] = (draws > p.cumsum(axis=1)[:, :2]).sum(axis=1)
+            if not burning:
+                totals[:, i] += p
+                squares[:, i] += p**2
+
+        if burning:
+            sweep += 1
+            burning = sweep < burn_in and (
+                burn_in_deadline is None or time.perf_counter() < burn_in_deadline
+            )
+        else:
+            counts += 1
+
+    return counts, totals, squares, sweep
+
+
+def gene_diagnostics(people, values):
+    """
+    Return a dictionary mapping each person in `people` to the entries of
+    row `i` of `values` for their gene distribution, in the same form as
+    the "gene" entries of `brute_force`.
+    """
+    return {
+        name: {"gene": {gene: float(values[i][gene]) for gene in (2, 1, 0)}}
+        for i, name in enumerate(people)
+    }
+
+
+def split_budget(total, parts):
+    """
+    Return a list splitting `total` as evenly as possible into `parts`
+    shares, or `parts` copies of None if `total` is None.
+    """
+    if total is None:
+        return [None] * parts
+    return [total // parts + (i < total % parts) for i in range(parts)]
+
+
+def run_workers(function, arguments, workers):
+    """
+    Return the results of calling `function` with each tuple of
+    `arguments`, on a pool of `workers` processes if there is more than one.
+    """
+    if workers == 1:
+        return [function(*args) for args in arguments]
+    with multiprocessing.Pool(workers) as pool:
+        return pool.starmap(function, arguments)
+
+
 if __name__ == "__main__":
     main()
@@ -1,19 +1,288 @@
+import collections
+import heapq
 import itertools
+import multiprocessing
+import weakref
+
+import numpy as np
+
+# Number of 64-bit words of models evaluated at once by bitwise_check
+BLOCK = 1 << 14
+
+# Number of unassigned symbols below which model_check stops pruning and
+# enumerates the remaining models with compiled sentences
+LEAF_SYMBOLS = 8
+
+# Returned while evaluating a sentence when it needs another operand's value
+PENDING = object()
+
+# Depth of nesting below which sentences are evaluated and rendered by
+# recursion, which is faster, rather than with an explicit stack
+RECURSION_DEPTH = 100
 
 
 class Sentence():
 
+    __slots__ = ("_hash", "_symbols", "_frozen", "__weakref__")
+
+    # Whether equal sentences of this class are shared as a single instance
+    _intern = False
+
+    # Method rendering the strings of the operands passed to each method
+    _operand_methods = {"_formula": "_formula", "_repr": "_repr"}
+
+    # Interned sentences, keyed by class and the ids of their operands
+    _interned = weakref.WeakValueDictionary()
+
+    def __new__(cls, *operands, **named):
+        if not cls._intern:
+            sentence = super().__new__(cls)
+            sentence._symbols = None
+            sentence._frozen = False
+            return sentence
+
+        # Bind operands passed by name to the slots that hold them, in
+        # order, so that they are interned like positional ones
+        if named:
+            operands += tuple(named.pop(name)
+                              for name in cls.__slots__[len(operands):]
+                              if name in named)
+            if named:
+                raise TypeError(f"{cls.__name__}() got an unexpected "
+                                f"keyword argument {next(iter(named))!r}")
+        if cls is not Symbol:
+            for operand in operands:
+                Sentence.validate(operand)
+
+        key = (cls,) + tuple(id(operand) if isinstance(operand, Sentence)
+                             else operand for operand in operands)
+        sentence = Sentence._interned.get(key)
+        if sentence is None:
+            sentence = super().__new__(cls)
+            sentence._symbols = None
+
+            # Only sentences that can never change cache their hash and
+            # symbols, so none containing a conjunction or disjunction do
+            sentence._frozen = all(operand._frozen for operand in operands
+                                   if isinstance(operand, Sentence))
+            Sentence._interned[key] = sentence
+        return sentence
+
+    def __eq__(self, other):
+        """Compares the logical sentences' structure with an explicit stack
+        rather than recursion."""
+        stack = [(self, other)]
+        while stack:
+            left, right = stack.pop()
+            if left is right:
+                continue
+            if not left._matches(right):
+                return False
+            stack.extend(zip(left.operands(), right.operands()))
+        return True
+
+    def __hash__(self):
+        self._refresh()
+        return self._hash
+
+    def __repr__(self):
+        return self._render("_repr")
+
+    def __reduce__(self):
+        # Pickle the subsentences as a flat list, each after its operands,
+        # so that deeply nested sentences do not exhaust the stack
+        order = self._postorder()
+        index = {id(sentence): i for i, sentence in enumerate(order)}
+        nodes = [sentence if isinstance(sentence, Symbol)
+                 else (type(sentence), [index[id(operand)]
+                                        for operand in sentence.operands()])
+                 for sentence in order]
+        return (rebuild_sentence, (nodes,))
+
     def evaluate(self, model):
         """Evaluates the logical sentence."""
-        raise Exception("nothing to evaluate")
+        return self._evaluate(model, Symbol.evaluate)
 
     def formula(self):
         """Returns string formula representing logical sentence."""
-        return ""
+        return self._render("_formula")
+
+    def evaluate_partial(self, model):
+        """Evaluates the logical sentence in a model that may leave out some
+        symbols, returning None if its value depends on them."""
+        return self._evaluate(model, Symbol.evaluate_partial)
+
+    def operands(self):
+        """Returns a list of the logical sentence's immediate subsentences."""
+        return []
 
     def symbols(self):
         """Returns a set of all symbols in the logical sentence."""
-        return set()
+        return set(self._symbol_set())
+
+    def _matches(self, other):
+        """Checks if another sentence is of the same kind with as many
+        operands, so that it is equal if all their operands are."""
+        return isinstance(other, type(self))
+
+    def _evaluate(self, model, evaluate_symbol, depth=0):
+        """Evaluates the logical sentence nested depth deep by recursion,
+        skipping operands that cannot change the result, and hands over to
+        _evaluate_deep once nested RECURSION_DEPTH deep."""
+        raise Exception("nothing to evaluate")
+
+    def _evaluate_deep(self, model, evaluate_symbol):
+        """Evaluates the logical sentence with an explicit stack rather than
+        recursion, skipping operands that cannot change the result and
+        evaluating each subsentence it contains more than once only once."""
+        known = dict()
+        stack = [(self, self.operands(), [])]
+        while True:
+            sentence, operands, values = stack[-1]
+            value = sentence._step(values)
+            if value is PENDING:
+                operand = operands[len(values)]
+                if isinstance(operand, Symbol):
+                    values.append(evaluate_symbol(operand, model))
+                elif id(operand) in known:
+                    values.append(known[id(operand)])
+                else:
+                    stack.append((operand, operand.operands(), []))
+                continue
+            stack.pop()
+            if not stack:
+                return value
+            known[id(sentence)] = value
+            stack[-1][2].append(value)
+
+    def _step(self, values):
+        """Returns the value of the logical sentence given the values of its
+        first few operands, or PENDING if it needs the next operand."""
+        raise Exception("nothing to evaluate")
+
+    def _postorder(self, include=None, flat=False):
+        """Returns the distinct subsentences of the logical sentence, each
+        after all of its operands, found with an explicit stack.
+
+        If include is given, only subsentences for which it returns true
+        are visited. If flat is true, conjunctions and disjunctions nested
+        directly in another of the same kind are merged into it."""
+        order = []
+        seen = set()
+        stack = [(self, False)]
+        while stack:
+            sentence, expanded = stack.pop()
+            if expanded:
+                order.append(sentence)
+            elif id(sentence) not in seen and (include is None
+                                               or include(sentence)):
+                seen.add(id(sentence))
+                stack.append((sentence, True))
+                operands = (sentence._flat_operands() if flat
+                            else sentence.operands())
+                stack.extend((operand, False)
+                             for operand in reversed(operands))
+        return order
+
+    def _flat_operands(self):
+        """Returns the operands, with nested conjunctions or disjunctions of
+        the same kind replaced by their own operands."""
+        return self.operands()
+
+    def _render(self, method, depth=0):
+        """Returns a string built bottom-up by calling the named method on
+        each subsentence with the strings of its operands, by recursion
+        while nested less than RECURSION_DEPTH deep."""
+        if depth < RECURSION_DEPTH:
+            depth += 1
+            operand_method = self._operand_methods[method]
+            parts = []
+            for operand in self.operands():
+                parts.append(operand._render(operand_method, depth))
+            return getattr(self, method)(parts)
+        return self._render_deep(method)
+
+    def _render_deep(self, method):
+        """Returns the string built by _render with an explicit stack rather
+        than recursion."""
+        order = self._postorder()
+
+        # Find the methods each subsentence is rendered with, parents first
+        methods = collections.defaultdict(set)
+        methods[id(self)].add(method)
+        for sentence in reversed(order):
+            for used in methods[id(sentence)]:
+                for operand in sentence.operands():
+                    methods[id(operand)].add(sentence._operand_methods[used])
+
+        # Drop each string once every sentence using it has been rendered
+        uses = collections.Counter(
+            (id(operand), sentence._operand_methods[used])
+            for sentence in order for used in methods[id(sentence)]
+            for operand in sentence.operands())
+        strings = dict()
+        for sentence in order:
+            for used in methods[id(sentence)]:
+                parts = []
+                for operand in sentence.operands():
+                    key = (id(operand), sentence._operand_methods[used])
+                    parts.append(strings[key])
+                    uses[key] -= 1
+                    if not uses[key]:
+                        del strings[key]
+                strings[(id(sentence), used)] = getattr(sentence, used)(parts)
+        return strings[(id(self), method)]
+
+    def _formula(self, parts):
+        return ""
+
+    def _repr(self, parts):
+        return object.__repr__(self)
+
+    def _symbol_set(self):
+        """Returns a frozenset of all symbols in the logical sentence."""
+        self._refresh()
+        return self._symbols
+
+    def _refresh(self):
+        """Computes the hash and symbols of the logical sentence and of its
+        subsentences, except those of sentences that cannot change, which
+        are computed only once."""
+        if self._uncached():
+            for sentence in self._postorder(Sentence._uncached):
+                sentence._hash = hash(sentence._hash_key())
+                sentence._symbols = sentence._find_symbols()
+
+    def _uncached(self):
+        return not self._frozen or self._symbols is None
+
+    def _hash_key(self):
+        """Returns a tuple identifying the logical sentence's structure,
+        given the hashes of its operands."""
+        return (id(self),)
+
+    def _find_symbols(self):
+        """Returns a frozenset of all symbols in the logical sentence,
+        given the symbols of its operands."""
+        return frozenset().union(*[operand._symbols
+                                   for operand in self.operands()])
+
+    def compile(self, symbols, bitwise=False):
+        """Returns a function that evaluates the logical sentence on a model
+        given as a sequence of truth values, one for each of the symbol
+        names in symbols, in order.
+
+        If bitwise is true, the truth values are instead NumPy uint64
+        arrays, each bit of which stands for a different model, and the
+        function returns such an array."""
+        program = Program(symbols, bitwise)
+        program.find_shared(self)
+        return program.function(program.expression(self))
+
+    def _compile(self, program, parts):
+        """Returns a Python expression evaluating the logical sentence,
+        given expressions for its flattened operands."""
+        raise Exception("nothing to evaluate")
 
     @classmethod
     def validate(cls, sentence):
@@ -44,14 +313,25 @@ class Sentence():
 
 class Symbol(Sentence):
 
+    __slots__ = ("name",)
+    _intern = True
+
     def __init__(self, name):
         self.name = name
 
     def __eq__(self, other):
         return isinstance(other, Symbol) and self.name == other.name
 
-    def __hash__(self):
-        return hash(("symbol", self.name))
+    __hash__ = Sentence.__hash__
+
+    def __reduce__(self):
+        return (Symbol, (self.name,))
+
+    def _matches(self, other):
+        return isinstance(other, Symbol) and self.name == other.name
+
+    def _hash_key(self):
+        return ("symbol", self.name)
 
     def __repr__(self):
         return self.name
@@ -62,202 +342,895 @@ class Symbol(Sentence):
         except KeyError:
             raise Exception(f"variable {self.name} not in model")
 
+    def evaluate_partial(self, model):
+        value = model.get(self.name)
+        return None if value is None else bool(value)
+
+    def _evaluate(self, model, evaluate_symbol, depth=0):
+        return evaluate_symbol(self, model)
+
     def formula(self):
         return self.name
 
-    def symbols(self):
-        return {self.name}
+    def _render(self, method, depth=0):
+        return self.name
+
+    def _formula(self, parts):
+        return self.name
+
+    _repr = _formula
+
+    def _find_symbols(self):
+        return frozenset([self.name])
+
+    def _compile(self, program, parts):
+        try:
+            return f"model[{program.index[self.name]}]"
+        except KeyError:
+            raise Exception(f"variable {self.name} not in model")
 
 
 class Not(Sentence):
+    __slots__ = ("operand",)
+    _intern = True
+
     def __init__(self, operand):
         Sentence.validate(operand)
         self.operand = operand
 
-    def __eq__(self, other):
-        return isinstance(other, Not) and self.operand == other.operand
+    def _hash_key(self):
+        return ("not", self.operand._hash)
 
-    def __hash__(self):
-        return hash(("not", hash(self.operand)))
+    def _repr(self, parts):
+        return f"Not({parts[0]})"
 
-    def __repr__(self):
-        return f"Not({self.operand})"
+    def _evaluate(self, model, evaluate_symbol, depth=0):
+        if depth >= RECURSION_DEPTH:
+            return self._evaluate_deep(model, evaluate_symbol)
+        value = self.operand._evaluate(model, evaluate_symbol, depth + 1)
+        return None if value is None else not value
 
-    def evaluate(self, model):
-        return not self.operand.evaluate(model)
+    def _step(self, values):
+        if not values:
+            return PENDING
+        return None if values[0] is None else not values[0]
 
-    def formula(self):
-        return "¬" + Sentence.parenthesize(self.operand.formula())
+    def operands(self):
+        return [self.operand]
 
-    def symbols(self):
-        return self.operand.symbols()
+    def _formula(self, parts):
+        return "¬" + Sentence.parenthesize(parts[0])
+
+    def _compile(self, program, parts):
+        if program.bitwise:
+            return f"(~{parts[0]})"
+        return f"(not {parts[0]})"
 
 
 class And(Sentence):
+    __slots__ = ("conjuncts",)
+
     def __init__(self, *conjuncts):
         for conjunct in conjuncts:
             Sentence.validate(conjunct)
         self.conjuncts = list(conjuncts)
 
-    def __eq__(self, other):
-        return isinstance(other, And) and self.conjuncts == other.conjuncts
+    def _matches(self, other):
+        return (isinstance(other, And)
+                and len(self.conjuncts) == len(other.conjuncts))
 
-    def __hash__(self):
-        return hash(
-            ("and", tuple(hash(conjunct) for conjunct in self.conjuncts))
-        )
+    def _hash_key(self):
+        return ("and", tuple(conjunct._hash for conjunct in self.conjuncts))
 
-    def __repr__(self):
-        conjunctions = ", ".join(
-            [str(conjunct) for conjunct in self.conjuncts]
-        )
+    def _repr(self, parts):
+        conjunctions = ", ".join(parts)
         return f"And({conjunctions})"
 
     def add(self, conjunct):
         Sentence.validate(conjunct)
         self.conjuncts.append(conjunct)
 
-    def evaluate(self, model):
-        return all(conjunct.evaluate(model) for conjunct in self.conjuncts)
-
-    def formula(self):
-        if len(self.conjuncts) == 1:
-            return self.conjuncts[0].formula()
-        return " ∧ ".join([Sentence.parenthesize(conjunct.formula())
-                           for conjunct in self.conjuncts])
-
-    def symbols(self):
-        return set.union(*[conjunct.symbols() for conjunct in self.conjuncts])
+    def _evaluate(self, model, evaluate_symbol, depth=0):
+        if depth >= RECURSION_DEPTH:
+            return self._evaluate_deep(model, evaluate_symbol)
+        result = True
+        for conjunct in self.conjuncts:
+            value = conjunct._evaluate(model, evaluate_symbol, depth + 1)
+            if value is False:
+                return False
+            if value is None:
+                result = None
+        return result
+
+    def _step(self, values):
+        if values and values[-1] is False:
+            return False
+        if len(values) < len(self.conjuncts):
+            return PENDING
+        return None if None in values else True
+
+    def operands(self):
+        return list(self.conjuncts)
+
+    def _flat_operands(self):
+        operands = []
+        stack = self.conjuncts[::-1]
+        while stack:
+            conjunct = stack.pop()
+            if type(conjunct) is And:
+                stack.extend(reversed(conjunct.conjuncts))
+            else:
+                operands.append(conjunct)
+        return operands
+
+    def _formula(self, parts):
+        if len(parts) == 1:
+            return parts[0]
+        return " ∧ ".join([Sentence.parenthesize(part) for part in parts])
+
+    def _compile(self, program, parts):
+        if not parts:
+            return "ones" if program.bitwise else "True"
+        return program.join(parts, " & " if program.bitwise else " and ")
 
 
 class Or(Sentence):
+    __slots__ = ("disjuncts",)
+
     def __init__(self, *disjuncts):
         for disjunct in disjuncts:
             Sentence.validate(disjunct)
         self.disjuncts = list(disjuncts)
 
-    def __eq__(self, other):
-        return isinstance(other, Or) and self.disjuncts == other.disjuncts
+    def _matches(self, other):
+        return (isinstance(other, Or)
+                and len(self.disjuncts) == len(other.disjuncts))
 
-    def __hash__(self):
-        return hash(
-            ("or", tuple(hash(disjunct) for disjunct in self.disjuncts))
-        )
+    def _hash_key(self):
+        return ("or", tuple(disjunct._hash for disjunct in self.disjuncts))
 
-    def __repr__(self):
-        disjuncts = ", ".join([str(disjunct) for disjunct in self.disjuncts])
+    def _repr(self, parts):
+        disjuncts = ", ".join(parts)
         return f"Or({disjuncts})"
 
-    def evaluate(self, model):
-        return any(disjunct.evaluate(model) for disjunct in self.disjuncts)
-
-    def formula(self):
-        if len(self.disjuncts) == 1:
-            return self.disjuncts[0].formula()
-        return " ∨  ".join([Sentence.parenthesize(disjunct.formula())
-                            for disjunct in self.disjuncts])
-
-    def symbols(self):
-        return set.union(*[disjunct.symbols() for disjunct in self.disjuncts])
+    def add(self, disjunct):
+        Sentence.validate(disjunct)
+        self.disjuncts.append(disjunct)
+
+    def _evaluate(self, model, evaluate_symbol, depth=0):
+        if depth >= RECURSION_DEPTH:
+            return self._evaluate_deep(model, evaluate_symbol)
+        result = False
+        for disjunct in self.disjuncts:
+            value = disjunct._evaluate(model, evaluate_symbol, depth + 1)
+            if value is True:
+                return True
+            if value is None:
+                result = None
+        return result
+
+    def _step(self, values):
+        if values and values[-1] is True:
+            return True
+        if len(values) < len(self.disjuncts):
+            return PENDING
+        return None if None in values else False
+
+    def operands(self):
+        return list(self.disjuncts)
+
+    def _flat_operands(self):
+        operands = []
+        stack = self.disjuncts[::-1]
+        while stack:
+            disjunct = stack.pop()
+            if type(disjunct) is Or:
+                stack.extend(reversed(disjunct.disjuncts))
+            else:
+                operands.append(disjunct)
+        return operands
+
+    def _formula(self, parts):
+        if len(parts) == 1:
+            return parts[0]
+        return " ∨  ".join([Sentence.parenthesize(part) for part in parts])
+
+    def _compile(self, program, parts):
+        if not parts:
+            return "zeros" if program.bitwise else "False"
+        return program.join(parts, " | " if program.bitwise else " or ")
 
 
 class Implication(Sentence):
+    __slots__ = ("antecedent", "consequent")
+    _intern = True
+
     def __init__(self, antecedent, consequent):
         Sentence.validate(antecedent)
         Sentence.validate(consequent)
         self.antecedent = antecedent
         self.consequent = consequent
 
-    def __eq__(self, other):
-        return (isinstance(other, Implication)
-                and self.antecedent == other.antecedent
-                and self.consequent == other.consequent)
+    def _hash_key(self):
+        return ("implies", self.antecedent._hash, self.consequent._hash)
 
-    def __hash__(self):
-        return hash(("implies", hash(self.antecedent), hash(self.consequent)))
+    def _repr(self, parts):
+        return f"Implication({parts[0]}, {parts[1]})"
 
-    def __repr__(self):
-        return f"Implication({self.antecedent}, {self.consequent})"
+    def _evaluate(self, model, evaluate_symbol, depth=0):
+        if depth >= RECURSION_DEPTH:
+            return self._evaluate_deep(model, evaluate_symbol)
+        antecedent = self.antecedent._evaluate(model, evaluate_symbol,
+                                               depth + 1)
+        if antecedent is False:
+            return True
+        consequent = self.consequent._evaluate(model, evaluate_symbol,
+                                               depth + 1)
+        if consequent is True:
+            return True
+        return None if antecedent is None or consequent is None else False
 
-    def evaluate(self, model):
-        return ((not self.antecedent.evaluate(model))
-                or self.consequent.evaluate(model))
+    def _step(self, values):
+        if values and values[0] is False:
+            return True
+        if len(values) < 2:
+            return PENDING
+        if values[1] is True:
+            return True
+        return None if values[0] is None or values[1] is None else False
 
-    def formula(self):
-        antecedent = Sentence.parenthesize(self.antecedent.formula())
-        consequent = Sentence.parenthesize(self.consequent.formula())
+    def operands(self):
+        return [self.antecedent, self.consequent]
+
+    def _formula(self, parts):
+        antecedent = Sentence.parenthesize(parts[0])
+        consequent = Sentence.parenthesize(parts[1])
         return f"{antecedent} => {consequent}"
 
-    def symbols(self):
-        return set.union(self.antecedent.symbols(), self.consequent.symbols())
+    def _compile(self, program, parts):
+        if program.bitwise:
+            return f"(~{parts[0]} | {parts[1]})"
+        return f"(not {parts[0]} or {parts[1]})"
 
 
 class Biconditional(Sentence):
+    __slots__ = ("left", "right")
+    _intern = True
+
+    # The formula shows the operands' representations, not their formulas
+    _operand_methods = {"_formula": "_repr", "_repr": "_repr"}
+
     def __init__(self, left, right):
         Sentence.validate(left)
         Sentence.validate(right)
         self.left = left
         self.right = right
 
-    def __eq__(self, other):
-        return (isinstance(other, Biconditional)
-                and self.left == other.left
-                and self.right == other.right)
-
-    def __hash__(self):
-        return hash(("biconditional", hash(self.left), hash(self.right)))
-
-    def __repr__(self):
-        return f"Biconditional({self.left}, {self.right})"
-
-    def evaluate(self, model):
-        return ((self.left.evaluate(model)
-                 and self.right.evaluate(model))
-                or (not self.left.evaluate(model)
-                    and not self.right.evaluate(model)))
-
-    def formula(self):
-        left = Sentence.parenthesize(str(self.left))
-        right = Sentence.parenthesize(str(self.right))
+    def _hash_key(self):
+        return ("biconditional", self.left._hash, self.right._hash)
+
+    def _repr(self, parts):
+        return f"Biconditional({parts[0]}, {parts[1]})"
+
+    def _evaluate(self, model, evaluate_symbol, depth=0):
+        if depth >= RECURSION_DEPTH:
+            return self._evaluate_deep(model, evaluate_symbol)
+        left = self.left._evaluate(model, evaluate_symbol, depth + 1)
+        if left is None:
+            return None
+        right = self.right._evaluate(model, evaluate_symbol, depth + 1)
+        if right is None:
+            return None
+        return left == right
+
+    def _step(self, values):
+        if values and values[-1] is None:
+            return None
+        if len(values) < 2:
+            return PENDING
+        return values[0] == values[1]
+
+    def operands(self):
+        return [self.left, self.right]
+
+    def _formula(self, parts):
+        left = Sentence.parenthesize(parts[0])
+        right = Sentence.parenthesize(parts[1])
         return f"{left} <=> {right}"
 
-    def symbols(self):
-        return set.union(self.left.symbols(), self.right.symbols())
-
-
-def model_check(knowledge, query):
-    """Checks if knowledge base entails query."""
+    def _compile(self, program, parts):
+        if program.bitwise:
+            return f"(~({parts[0]} ^ {parts[1]}))"
+        return f"((not {parts[0]}) == (not {parts[1]}))"
 
-    def check_all(knowledge, query, symbols, model):
-        """Checks if knowledge base entails query, given a particular model."""
 
-        # If model has an assignment for each symbol
-        if not symbols:
-
-            # If knowledge base is true in model, then query must also be true
-            if knowledge.evaluate(model):
-                return query.evaluate(model)
-            return True
+def rebuild_sentence(nodes):
+    """Returns the logical sentence pickled by Sentence.__reduce__, from a
+    list of its subsentences, each either a symbol or a sentence class and
+    the positions of its operands earlier in the list."""
+    sentences = []
+    for node in nodes:
+        if isinstance(node, Sentence):
+            sentences.append(node)
         else:
-
-            # Choose one of the remaining unused symbols
-            remaining = symbols.copy()
-            p = remaining.pop()
-
-            # Create a model where the symbol is true
-            model_true = model.copy()
-            model_true[p] = True
-
-            # Create a model where the symbol is false
-            model_false = model.copy()
-            model_false[p] = False
-
-            # Ensure entailment holds in both models
-            return (check_all(knowledge, query, remaining, model_true) and
-                    check_all(knowledge, query, remaining, model_false))
+            cls, operands = node
+            sentences.append(cls(*[sentences[i] for i in operands]))
+    return sentences[-1]
+
+
+class Program():
+    """Python source for a function evaluating a logical sentence on a
+    list of truth values, built up by Sentence.compile.
+
+    Nested conjunctions and disjunctions are flattened into a single
+    operator chain, or a balanced tree of bitwise operators. Subexpressions
+    are hoisted into local variables, evaluated up front, when they occur
+    more than once, so that each is evaluated only once per model, or when
+    nested more than MAX_DEPTH deep, so that the generated source stays
+    within the parser's nesting limit.
+    """
+
+    MAX_DEPTH = 50
+
+    def __init__(self, symbols, bitwise=False):
+        self.index = {name: i for i, name in enumerate(symbols)}
+        self.bitwise = bitwise
+        self.lines = []
+        self.shared = set()
+
+    def find_shared(self, sentence):
+        """Records the compound subsentences of sentence that it contains
+        more than once."""
+        seen = set()
+        stack = [sentence]
+        while stack:
+            sentence = stack.pop()
+            if id(sentence) in seen:
+                if not isinstance(sentence, Symbol):
+                    self.shared.add(id(sentence))
+                continue
+            seen.add(id(sentence))
+            stack.extend(sentence._flat_operands())
+
+    def expression(self, sentence):
+        """Returns an expression for sentence, hoisting subexpressions that
+        are shared or too deep."""
+        texts = dict()
+        depths = dict()
+        for subsentence in sentence._postorder(flat=True):
+            key = id(subsentence)
+            operands = [id(operand)
+                        for operand in subsentence._flat_operands()]
+            text = subsentence._compile(
+                self, [texts[operand] for operand in operands]
+            )
+            depth = max([depths[operand] for operand in operands], default=0)
+            if self.bitwise:
+                depth += len(operands).bit_length()
+            else:
+                depth += 1
+            if depth > Program.MAX_DEPTH or key in self.shared:
+                name = f"t{len(self.lines)}"
+                self.lines.append(f"    {name} = {text}")
+                text = name
+                depth = 1
+            texts[key] = text
+            depths[key] = depth
+        return texts[id(sentence)]
+
+    def join(self, parts, operator):
+        """Returns an expression joining parts with operator.
+
+        Bitwise operators nest to the left, so their operands are paired up
+        into a balanced tree rather than chained, keeping the nesting depth
+        logarithmic in the number of parts."""
+        if not self.bitwise:
+            return "(" + operator.join(parts) + ")"
+        while len(parts) > 1:
+            parts = ["(" + operator.join(parts[i:i + 2]) + ")"
+                     for i in range(0, len(parts), 2)]
+        return parts[0]
+
+    def function(self, expression):
+        """Returns the compiled function returning expression."""
+        if self.bitwise:
+            namespace = {"ones": ~np.uint64(0), "zeros": np.uint64(0)}
+        else:
+            namespace = dict()
+            expression = f"bool({expression})"
+        source = "\n".join(["def evaluate(model):"] + self.lines
+                           + [f"    return {expression}"])
+        exec(source, namespace)
+        return namespace["evaluate"]
+
+
+def model_check(knowledge, query, backend="enumerate", workers=1):
+    """Checks if knowledge base entails query.
+
+    The "enumerate" backend searches over assignments to the symbols,
+    cutting off a branch as soon as the partial assignment makes knowledge
+    base false or decides the query, and enumerates the models of the last
+    few symbols directly. With more than one worker, it splits the models
+    by the values of the first few symbols between a pool of processes,
+    stopping them all once any finds a counter-example. The "bitwise"
+    backend checks blocks of models at once with NumPy, which pays off
+    from about a dozen symbols up to about thirty. The "sat" backend
+    instead checks that knowledge and the negated query cannot both be
+    satisfied, using a CDCL SAT solver on their CNF encoding.
+    """
+    if backend not in ("enumerate", "bitwise", "sat"):
+        raise ValueError(f"unknown backend {backend}")
+    if workers != 1 and backend != "enumerate":
+        raise ValueError("workers only apply to the enumerate backend")
+    if backend == "sat":
+        cnf = CNF()
+        cnf.add(knowledge)
+        cnf.add(Not(query))
+        return cnf.solve() is None
 
     # Get all symbols in both knowledge and query
-    symbols = set.union(knowledge.symbols(), query.symbols())
+    symbols = list(set.union(knowledge.symbols(), query.symbols()))
+    if backend == "bitwise":
+        return bitwise_check(knowledge, query, symbols)
+
+    # Assign the most frequent symbols first, so branches are decided early
+    counts = occurrences(knowledge) + occurrences(query)
+    symbols.sort(key=lambda symbol: (-counts[symbol], symbol))
+    if workers == 1:
+        return ModelCheck(knowledge, query, symbols).check_all(dict(), 0)
+
+    # Fix the first few symbols in each of a few subproblems per worker
+    k = min(len(symbols), (4 * workers - 1).bit_length())
+    prefixes = itertools.product((True, False), repeat=k)
+    with multiprocessing.Pool(workers, initializer=start_worker,
+                              initargs=(knowledge, query, symbols)) as pool:
+        for entailed in pool.imap_unordered(check_prefix, prefixes):
+
+            # Leaving the pool terminates the workers still checking
+            if not entailed:
+                return False
+    return True
+
+
+class ModelCheck():
+    """A check of whether knowledge base entails query, searching over
+    assignments to symbols in order."""
+
+    def __init__(self, knowledge, query, symbols):
+        self.knowledge = knowledge
+        self.query = query
+        self.symbols = symbols
+
+        # Compile both into functions of a tuple of truth values
+        self.compiled_knowledge = knowledge.compile(symbols)
+        self.compiled_query = query.compile(symbols)
+
+    def check_all(self, model, i):
+        """Checks if knowledge base entails query, given a model of the
+        first i symbols."""
+
+        # If query is already true, or knowledge base already false, every
+        # completion of the model is fine
+        value = self.query.evaluate_partial(model)
+        if value is True:
+            return True
+        known = self.knowledge.evaluate_partial(model)
+        if known is False:
+            return True
 
-    # Check that knowledge entails query
-    return check_all(knowledge, query, symbols, dict())
+        # If knowledge base is already true and query false, every
+        # completion is a counter-example
+        if known is True and value is False:
+            return False
+
+        # Enumerate all models of the last few symbols
+        remaining = len(self.symbols) - i
+        if remaining <= LEAF_SYMBOLS:
+            prefix = tuple(model[symbol] for symbol in self.symbols[:i])
+            return all(self.compiled_query(prefix + rest)
+                       for rest in itertools.product((True, False),
+                                                     repeat=remaining)
+                       if self.compiled_knowledge(prefix + rest))
+
+        # Ensure entailment holds with the next symbol both true and false
+        p = self.symbols[i]
+        for value in (True, False):
+            model[p] = value
+            if not self.check_all(model, i + 1):
+                return False
+        del model[p]
+        return True
+
+
+# The ModelCheck run by this process, if it is a model_check worker
+worker_check = None
+
+
+def start_worker(knowledge, query, symbols):
+    """Sets up a model_check worker process."""
+    global worker_check
+    worker_check = ModelCheck(knowledge, query, symbols)
+
+
+def check_prefix(prefix):
+    """Checks entailment in a model_check worker, in the models where the
+    first symbols take the truth values in prefix."""
+    model = dict(zip(worker_check.symbols, prefix))
+    return worker_check.check_all(model, len(prefix))
+
+
+def occurrences(sentence):
+    """Returns a Counter of how often each symbol occurs in sentence."""
+    counts = collections.Counter()
+    stack = [sentence]
+    while stack:
+        sentence = stack.pop()
+        if isinstance(sentence, Symbol):
+            counts[sentence.name] += 1
+        stack.extend(sentence.operands())
+    return counts
+
+
+def entailments(knowledge, queries):
+    """Checks many queries against a knowledge base at once.
+
+    Returns a list with, for each query, True if knowledge base entails
+    it, False if knowledge base entails its negation, and None if neither.
+    Models are enumerated only once for all of the queries, stopping early
+    once every query is known to be None.
+    """
+    queries = list(queries)
+    symbols = list(set.union(knowledge.symbols(),
+                             *[query.symbols() for query in queries]))
+    knowledge = knowledge.compile(symbols)
+    compiled = [query.compile(symbols) for query in queries]
+
+    # Indices of queries not yet seen false, and not yet seen true, in a
+    # model where knowledge base is true
+    entailed = set(range(len(queries)))
+    refuted = set(range(len(queries)))
+    for model in itertools.product((True, False), repeat=len(symbols)):
+        if not knowledge(model):
+            continue
+        for i in entailed | refuted:
+            if compiled[i](model):
+                refuted.discard(i)
+            else:
+                entailed.discard(i)
+        if not entailed and not refuted:
+            break
+
+    # If knowledge base has no models, it entails everything
+    return [True if i in entailed else False if i in refuted else None
+            for i in range(len(queries))]
+
+
+def bitwise_check(knowledge, query, symbols, block=BLOCK):
+    """Checks if knowledge base entails query over every model of symbols,
+    evaluating both on block 64-bit words of models at a time.
+
+    Bit b of word w in block k stands for the model numbered
+    (k * block + w) * 64 + b, where the ith symbol is true if bit i of the
+    model number is set. The first six symbols are therefore the same bit
+    pattern in every word, the next few alternate between words, and the
+    rest are constant over a block.
+    """
+
+    n = len(symbols)
+    words = min(block, 1 << max(n - 6, 0))
+    word_symbols = words.bit_length() - 1
+    ones = np.full(words, ~np.uint64(0))
+    zeros = np.zeros(words, dtype=np.uint64)
+    index = np.arange(words)
+
+    # With fewer than six symbols the spare bits repeat earlier models, so
+    # they need no masking
+    columns = []
+    for i in range(min(n, 6)):
+        pattern = sum(1 << b for b in range(64) if b >> i & 1)
+        columns.append(np.full(words, pattern, dtype=np.uint64))
+    for i in range(word_symbols):
+        columns.append(np.where(index >> i & 1, ones, zeros))
+
+    knowledge = knowledge.compile(symbols, bitwise=True)
+    query = query.compile(symbols, bitwise=True)
+    for k in range(1 << max(n - 6 - word_symbols, 0)):
+        model = columns + [ones if k >> i & 1 else zeros
+                           for i in range(n - len(columns))]
+
+        # Look for a model where knowledge base is true but query is not
+        if np.any(knowledge(model) & ~query(model)):
+            return False
+    return True
+
+
+class CNF():
+    """Conjunctive normal form of sentences, built by Tseitin encoding.
+
+    Symbols and compound subsentences are numbered as integer variables,
+    and clauses are lists of literals: a variable number for a true
+    variable, or its negation for a false one. Each compound subsentence
+    gets a fresh variable constrained to equal it, so the encoding grows
+    linearly with the sentences added.
+    """
+
+    def __init__(self):
+        self.variables = dict()
+        self.clauses = []
+        self.count = 0
+        self._literals = dict()
+        self._true = None
+
+    def variable(self, name):
+        """Returns the variable for the symbol with the given name."""
+        if name not in self.variables:
+            self.variables[name] = self._fresh()
+        return self.variables[name]
+
+    def add(self, sentence):
+        """Adds the constraint that sentence is true."""
+        self.clauses.append([self.literal(sentence)])
+
+    def literal(self, sentence):
+        """Returns a literal that is true exactly when sentence is."""
+        Sentence.validate(sentence)
+        for subsentence in sentence._postorder(self._unencoded, flat=True):
+            literals = [self._literals[id(operand)][1]
+                        for operand in subsentence._flat_operands()]
+
+            # Keep the sentence alive so its id cannot be reused
+            self._literals[id(subsentence)] = (
+                subsentence, self._encode(subsentence, literals)
+            )
+        return self._literals[id(sentence)][1]
+
+    def _unencoded(self, sentence):
+        return id(sentence) not in self._literals
+
+    def _encode(self, sentence, literals):
+        """Returns a literal equal to sentence, given literals for its
+        flattened operands."""
+        if isinstance(sentence, Symbol):
+            return self.variable(sentence.name)
+        elif isinstance(sentence, Not):
+            return -literals[0]
+        elif isinstance(sentence, And):
+            return self._conjunction(literals)
+        elif isinstance(sentence, Or):
+            return -self._conjunction([-literal for literal in literals])
+        elif isinstance(sentence, Implication):
+            return -self._conjunction([literals[0], -literals[1]])
+        elif isinstance(sentence, Biconditional):
+            left, right = literals
+            literal = self._fresh()
+            self.clauses.extend([
+                [-literal, -left, right], [-literal, left, -right],
+                [literal, left, right], [literal, -left, -right]
+            ])
+            return literal
+        raise TypeError("must be a logical sentence")
+
+    def solve(self):
+        """Returns a satisfying model as a dictionary from symbol names to
+        truth values, or None if the clauses are unsatisfiable."""
+        assignment = solve_cnf(self.clauses, self.count)
+        if assignment is None:
+            return None
+        return {name: assignment[variable]
+                for name, variable in self.variables.items()}
+
+    def _fresh(self):
+        self.count += 1
+        return self.count
+
+    def _conjunction(self, literals):
+        """Returns a fresh literal constrained to equal the conjunction of
+        literals."""
+        if not literals:
+            if self._true is None:
+                self._true = self._fresh()
+                self.clauses.append([self._true])
+            return self._true
+        literal = self._fresh()
+        for conjunct in literals:
+            self.clauses.append([-literal, conjunct])
+        self.clauses.append([literal] + [-conjunct for conjunct in literals])
+        return literal
+
+
+def solve_cnf(clauses, count):
+    """Returns a list mapping each variable from 1 to count to a truth
+    value satisfying every clause, or None if there is none.
+
+    Uses conflict-driven clause learning: unit propagation over two
+    watched literals per clause, learning the first-UIP clause of every
+    conflict, backjumping to the level where it becomes unit, branching
+    on the variables most involved in recent conflicts, and restarting
+    after geometrically growing numbers of conflicts.
+    """
+    value = [None] * (count + 1)
+    level = [0] * (count + 1)
+    reason = [None] * (count + 1)
+    activity = [0.0] * (count + 1)
+    phase = [False] * (count + 1)
+    watches = {literal: [] for v in range(1, count + 1)
+               for literal in (v, -v)}
+    trail = []
+    trail_limits = []
+    increment = 1.0
+    clauses = [list(dict.fromkeys(clause)) for clause in clauses]
+
+    # Heap of unassigned variables by activity, where entries whose
+    # activity has since changed are skipped when popped
+    order = [(0.0, v) for v in range(1, count + 1)]
+
+    def truth(literal):
+        v = value[abs(literal)]
+        return v if v is None or literal > 0 else not v
+
+    def assign(literal, cause):
+        v = abs(literal)
+        value[v] = literal > 0
+        level[v] = len(trail_limits)
+        reason[v] = cause
+        trail.append(literal)
+
+    def bump(v):
+        """Raises the activity of variable v, rescaling every activity
+        before they overflow."""
+        nonlocal increment, order
+        activity[v] += increment
+        if activity[v] > 1e100:
+            for u in range(1, count + 1):
+                activity[u] *= 1e-100
+            increment *= 1e-100
+            order = [(-activity[u], u) for u in range(1, count + 1)
+                     if value[u] is None]
+            heapq.heapify(order)
+        elif value[v] is None:
+            heapq.heappush(order, (-activity[v], v))
+
+    def watch(index):
+        clause = clauses[index]
+        watches[clause[0]].append(index)
+        watches[clause[1]].append(index)
+
+    def propagate(head):
+        """Assigns every literal forced by the trail from position head,
+        returning the index of a falsified clause, or None."""
+        while head < len(trail):
+            false = -trail[head]
+            head += 1
+            watching = watches[false]
+            watches[false] = []
+            for position, index in enumerate(watching):
+                clause = clauses[index]
+
+                # Keep the falsified watch in second place
+                if clause[0] == false:
+                    clause[0], clause[1] = clause[1], clause[0]
+                if truth(clause[0]) is True:
+                    watches[false].append(index)
+                    continue
+
+                # Watch another literal that is not false, if there is one
+                for k in range(2, len(clause)):
+                    if truth(clause[k]) is not False:
+                        clause[1], clause[k] = clause[k], clause[1]
+                        watches[clause[1]].append(index)
+                        break
+                else:
+                    watches[false].append(index)
+                    if truth(clause[0]) is False:
+                        watches[false].extend(watching[position + 1:])
+                        return index
+                    assign(clause[0], index)
+        return None
+
+    def analyze(conflict):
+        """Returns the first-UIP clause learned from a conflict, with its
+        asserting literal first, and the level to backjump to."""
+        nonlocal increment
+        learned = [None]
+        seen = set()
+        current = len(trail_limits)
+        pending = 0
+        literal = None
+        position = len(trail) - 1
+        clause = clauses[conflict]
+        while True:
+            for other in (clause if literal is None else clause[1:]):
+                v = abs(other)
+                if v not in seen and level[v] > 0:
+                    seen.add(v)
+                    bump(v)
+                    if level[v] == current:
+                        pending += 1
+                    else:
+                        learned.append(other)
+
+            # Resolve on the latest assigned literal of the current level
+            while abs(trail[position]) not in seen:
+                position -= 1
+            literal = trail[position]
+            position -= 1
+            seen.discard(abs(literal))
+            pending -= 1
+            if pending == 0:
+                break
+            clause = clauses[reason[abs(literal)]]
+
+        learned[0] = -literal
+        increment /= 0.95
+        if len(learned) == 1:
+            return learned, 0
+        deepest = max(range(1, len(learned)),
+                      key=lambda k: level[abs(learned[k])])
+        learned[1], learned[deepest] = learned[deepest], learned[1]
+        return learned, level[abs(learned[1])]
+
+    def backjump(target):
+        """Undoes every assignment above level target, remembering the
+        values undone as the preferred values for later decisions."""
+        start = trail_limits[target]
+        for literal in trail[start:]:
+            v = abs(literal)
+            phase[v] = value[v]
+            value[v] = None
+            reason[v] = None
+            heapq.heappush(order, (-activity[v], v))
+        del trail[start:]
+        del trail_limits[target:]
+
+    # Assign unit clauses up front and watch the rest
+    for index, clause in enumerate(clauses):
+        if any(-literal in clause for literal in clause):
+            continue
+        if not clause:
+            return None
+        if len(clause) == 1:
+            if truth(clause[0]) is False:
+                return None
+            if truth(clause[0]) is None:
+                assign(clause[0], None)
+        else:
+            watch(index)
+
+    head = 0
+    conflicts = 0
+    restart = 300
+    while True:
+        conflict = propagate(head)
+        head = len(trail)
+        if conflict is not None:
+            if not trail_limits:
+                return None
+            conflicts += 1
+            learned, target = analyze(conflict)
+            backjump(target)
+            head = len(trail)
+            if len(learned) == 1:
+                assign(learned[0], None)
+            else:
+                clauses.append(learned)
+                watch(len(clauses) - 1)
+                assign(learned[0], len(clauses) - 1)
+            continue
+
+        # Restart, keeping learned clauses, activities and phases
+        if conflicts >= restart and trail_limits:
+            conflicts = 0
+            restart = restart * 3 // 2
+            backjump(0)
+            head = len(trail)
+            continue
+
+        # Branch on the most active unassigned variable
+        while order:
+            key, v = heapq.heappop(order)
+            if value[v] is None and -key == activity[v]:
+                break
+        else:
+            return value
+        trail_limits.append(len(trail))
+        assign(v if phase[v] else -v, None)
@@ -0,0 +1,235 @@
+"""
+Benchmark crawling, sampling and iterating PageRank on synthetic corpora.
+
+Usage: python benchmark.py [--sizes 100 1000 ...] [--output results.json]
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from pagerank import (
+    DAMPING,
+    SAMPLES,
+    LinkGraph,
+    crawl,
+    iterate_pagerank,
+    power_iterate,
+    sample_pagerank,
+)
+
+GRAPHS = ["power-law", "dangling", "disconnected"]
+SIZES = [10**2, 10**3, 10**4, 10**5, 10**6]
+CRAWL_LIMIT = 10**5
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--graphs", nargs="+", choices=GRAPHS, default=GRAPHS)
+    parser.add_argument("--samples", type=int, default=SAMPLES)
+    parser.add_argument("--walkers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--crawl-limit",
+        type=int,
+        default=CRAWL_LIMIT,
+        help="largest corpus to write out as HTML and crawl",
+    )
+    parser.add_argument(
+        "--skip-memory",
+        action="store_true",
+        help="do not rerun each step under tracemalloc to measure peak memory",
+    )
+    parser.add_argument("--output", help="write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for kind in args.graphs:
+        for size in args.sizes:
+            results.append(
+                benchmark(
+                    kind,
+                    size,
+                    samples=args.samples,
+                    walkers=args.walkers,
+                    seed=args.seed,
+                    include_crawl=size <= args.crawl_limit,
+                    memory=not args.skip_memory,
+                )
+            )
+
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+def power_law_corpus(n, links=3, seed=None):
+    """
+    Return a corpus of `n` pages grown by preferential attachment
+    (Barabási–Albert): each new page links to `links` distinct earlier
+    pages, chosen with probability proportional to their degree.
+    """
+    rng = random.Random(seed)
+    pages = [f"{i}.html" for i in range(n)]
+    corpus = {page: set() for page in pages}
+
+    # Every page appears once per link it takes part in, so a uniform
+    # choice from `ends` is a choice weighted by degree
+    ends = list(range(min(links, n)))
+    for i in range(min(links, n), n):
+        targets = set()
+        while len(targets) < links:
+            targets.add(rng.choice(ends))
+        for target in targets:
+            corpus[pages[i]].add(pages[target])
+            ends.extend((i, target))
+    return corpus
+
+
+def dangling_corpus(n, fraction=0.5, links=3, seed=None):
+    """
+    Return a corpus of `n` pages where a `fraction` of pages have no links
+    and every other page links to up to `links` pages chosen uniformly.
+    """
+    rng = random.Random(seed)
+    pages = [f"{i}.html" for i in range(n)]
+    corpus = dict()
+    for page in pages:
+        if rng.random() < fraction:
+            corpus[page] = set()
+        else:
+            corpus[page] = set(rng.choices(pages, k=links)) - {page}
+    return corpus
+
+
+def disconnected_corpus(n, components=4, links=3, seed=None):
+    """
+    Return a corpus of `n` pages split into `components` groups, where each
+    page links to up to `links` pages chosen uniformly from its own group.
+    """
+    rng = random.Random(seed)
+    pages = [f"{i}.html" for i in range(n)]
+    corpus = dict()
+    for c in range(components):
+        group = pages[c::components]
+        for page in group:
+            corpus[page] = set(rng.choices(group, k=links)) - {page}
+    return corpus
+
+
+GENERATORS = {
+    "power-law": power_law_corpus,
+    "dangling": dangling_corpus,
+    "disconnected": disconnected_corpus,
+}
+
+
+def write_corpus(corpus, directory):
+    """
+    Write `corpus` to `directory` as HTML pages that `crawl` can read.
+    """
+    for page, links in corpus.items():
+        with open(os.path.join(directory, page), "w") as f:
+            f.write("<!DOCTYPE html>\n<html>\n<body>\n")
+            for link in sorted(links):
+                f.write(f'<a href="{link}">{link}</a>\n')
+            f.write("</body>\n</html>\n")
+
+
+def reference_ranks(corpus):
+    """
+    Return PageRank values for `corpus` computed to a tight tolerance.
+    """
+    graph = LinkGraph.from_corpus(corpus)
+    return graph.to_dict(power_iterate(graph, DAMPING, threshold=1e-12, norm="l1"))
+
+
+def l1_error(ranks, reference):
+    """
+    Return the L1 distance between two dictionaries of PageRank values.
+    """
+    return sum(abs(ranks[page] - reference[page]) for page in reference)
+
+
+def measure(function, *args, memory=True, **kwargs):
+    """
+    Call `function` and return a tuple `(result, seconds, peak_bytes)`.
+
+    The peak traced memory is measured in a second call under tracemalloc,
+    so that tracing overhead does not distort the timing; it is None if
+    `memory` is false.
+    """
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    seconds = time.perf_counter() - start
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        function(*args, **kwargs)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, seconds, peak
+
+
+def benchmark(kind, size, samples, walkers, seed, include_crawl=True, memory=True):
+    """
+    Return a dictionary of timings, throughput, peak memory and accuracy
+    for crawling, sampling and iterating one synthetic corpus.
+    """
+    corpus = GENERATORS[kind](size, seed=seed)
+    reference = reference_ranks(corpus)
+    result = {
+        "graph": kind,
+        "pages": size,
+        "links": sum(len(links) for links in corpus.values()),
+    }
+
+    result["crawl"] = None
+    if include_crawl:
+        with tempfile.TemporaryDirectory() as directory:
+            write_corpus(corpus, directory)
+            crawled, seconds, peak = measure(crawl, directory, memory=memory)
+        result["crawl"] = {
+            "seconds": seconds,
+            "pages_per_second": size / seconds,
+            "peak_bytes": peak,
+            "matches": crawled == corpus,
+        }
+
+    ranks, seconds, peak = measure(
+        sample_pagerank,
+        corpus,
+        DAMPING,
+        samples,
+        walkers=walkers,
+        seed=seed,
+        memory=memory,
+    )
+    result["sample"] = {
+        "seconds": seconds,
+        "samples_per_second": samples / seconds,
+        "peak_bytes": peak,
+        "l1_error": l1_error(ranks, reference),
+    }
+
+    ranks, seconds, peak = measure(iterate_pagerank, corpus, DAMPING, memory=memory)
+    result["iterate"] = {
+        "seconds": seconds,
+        "pages_per_second": size / seconds,
+        "peak_bytes": peak,
+        "l1_error": l1_error(ranks, reference),
+    }
+    return result
+
+
+if __name__ == "__main__":
+    main()
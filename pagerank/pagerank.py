@@ -1,10 +1,26 @@
+import math
+import multiprocessing
 import os
 import random
 import re
 import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 
 DAMPING = 0.85
 SAMPLES = 10000
+BURN_IN_TOLERANCE = 0.0001
+THRESHOLD = 0.0001
+EXTRAPOLATION_PERIOD = 10
+GAUSS_SEIDEL_BLOCKS = 64
+PUSH_FRACTION = 0.1
+EDGE_BLOCK = 1 << 24
+EDGE_DTYPE = np.dtype("<i4")
+
+LINK_PATTERN = re.compile(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"")
 
 
 def main():
@@ -21,30 +37,154 @@ def main():
         print(f"  {page}: {ranks[page]:.4f}")
 
 
-def crawl(directory):
+def crawl(directory, workers=1, cache=None):
     """
     Parse a directory of HTML pages and check for links to other pages.
     Return a dictionary where each key is a page, and values are
     a list of all other pages in the corpus that are linked to by the page.
-    """
-    pages = dict()
 
-    # Extract all links from HTML files
-    for filename in os.listdir(directory):
-        if not filename.endswith(".html"):
-            continue
-        with open(os.path.join(directory, filename)) as f:
-            contents = f.read()
-            links = re.findall(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"", contents)
-            pages[filename] = set(links) - {filename}
+    Pages are parsed on a pool of `workers` processes. If `cache` is the
+    path of a cache file, the links found in each page are stored there
+    keyed by file path, modification time and size, so later crawls only
+    reparse pages that have changed.
+    """
+    filenames = [
+        filename for filename in os.listdir(directory) if filename.endswith(".html")
+    ]
+    paths = [os.path.join(directory, filename) for filename in filenames]
+    keys = []
+    for path in paths:
+        stat = os.stat(path)
+        keys.append((path, stat.st_mtime_ns, stat.st_size))
+
+    # Reuse links from unchanged pages and parse the rest
+    cached = load_crawl_cache(cache) if cache and os.path.exists(cache) else {}
+    stale = [key for key in keys if key not in cached]
+    if workers > 1 and len(stale) > 1:
+        chunksize = max(1, len(stale) // (workers * 4))
+        with ProcessPoolExecutor(workers) as executor:
+            parsed = executor.map(
+                parse_links, [key[0] for key in stale], chunksize=chunksize
+            )
+            cached.update(zip(stale, parsed))
+    else:
+        cached.update((key, parse_links(key[0])) for key in stale)
+
+    if cache and stale:
+        save_crawl_cache(cache, {key: cached[key] for key in keys})
 
     # Only include links to other pages in the corpus
+    pages = dict()
+    for filename, key in zip(filenames, keys):
+        pages[filename] = set(cached[key]) - {filename}
     for filename in pages:
         pages[filename] = set(link for link in pages[filename] if link in pages)
 
     return pages
 
 
+def parse_links(path):
+    """
+    Return a list of the targets of all links in the HTML file at `path`.
+    """
+    with open(path) as f:
+        return LINK_PATTERN.findall(f.read())
+
+
+def load_crawl_cache(path):
+    """
+    Load a crawl cache written by `save_crawl_cache`, returning a dictionary
+    mapping `(path, mtime_ns, size)` keys to lists of link targets.
+    """
+    with np.load(path) as data:
+        targets = data["targets"].tolist()
+        links = data["links"].tolist()
+        indptr = data["indptr"].tolist()
+        keys = zip(
+            data["paths"].tolist(), data["mtimes"].tolist(), data["sizes"].tolist()
+        )
+        return {
+            key: [targets[link] for link in links[indptr[i] : indptr[i + 1]]]
+            for i, key in enumerate(keys)
+        }
+
+
+def save_crawl_cache(path, entries):
+    """
+    Save a dictionary mapping `(path, mtime_ns, size)` keys to lists of link
+    targets to the cache file at `path`.
+
+    Link targets are interned into a single table, so the links of every
+    page are stored as an integer edge list in CSR layout.
+    """
+    targets = dict()
+    indptr = [0]
+    links = []
+    for page_links in entries.values():
+        links.extend(targets.setdefault(link, len(targets)) for link in page_links)
+        indptr.append(len(links))
+
+    # Write to a temporary file first so an interrupted crawl leaves no
+    # truncated cache behind
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as f:
+        np.savez(
+            f,
+            paths=np.array([key[0] for key in entries], dtype=str),
+            mtimes=np.array([key[1] for key in entries], dtype=np.int64),
+            sizes=np.array([key[2] for key in entries], dtype=np.int64),
+            indptr=np.array(indptr, dtype=np.int64),
+            links=np.array(links, dtype=np.int32),
+            targets=np.array(list(targets), dtype=str),
+        )
+    os.replace(temporary, path)
+
+
+def convert_corpus(directory, prefix):
+    """
+    Crawl the HTML pages in `directory` into the on-disk edge list format
+    read by `memmap_pagerank`, one page at a time, so only the page names
+    are held in memory.
+
+    Writes the page names, one per line, to `{prefix}.pages` and every
+    link as a pair of little-endian 32-bit page indices to `{prefix}.edges`.
+    """
+    filenames = [
+        filename for filename in os.listdir(directory) if filename.endswith(".html")
+    ]
+    index = {filename: i for i, filename in enumerate(filenames)}
+    with open(f"{prefix}.edges", "wb") as f:
+        for i, filename in enumerate(filenames):
+            links = set(parse_links(os.path.join(directory, filename))) - {filename}
+            targets = [index[link] for link in links if link in index]
+            edges = np.empty((len(targets), 2), dtype=EDGE_DTYPE)
+            edges[:, 0] = i
+            edges[:, 1] = targets
+            edges.tofile(f)
+    save_page_names(filenames, prefix)
+
+
+def save_edge_list(corpus, prefix):
+    """
+    Save `corpus` in the on-disk edge list format read by `memmap_pagerank`.
+    """
+    graph = LinkGraph.from_corpus(corpus)
+    edges = np.empty((len(graph.indices), 2), dtype=EDGE_DTYPE)
+    edges[:, 0] = graph.sources
+    edges[:, 1] = graph.indices
+    edges.tofile(f"{prefix}.edges")
+    save_page_names(graph.pages, prefix)
+
+
+def save_page_names(pages, prefix):
+    """
+    Save the page names of an on-disk edge list to `{prefix}.pages`.
+    """
+    with open(f"{prefix}.pages", "w") as f:
+        for page in pages:
+            f.write(f"{page}\n")
+
+
 def transition_model(corpus, page, damping_factor):
     """
     Return a probability distribution over which page to visit next,
@@ -69,71 +209,739 @@ def transition_model(corpus, page, damping_factor):
     return probability_distribution
 
 
-def sample_pagerank(corpus, damping_factor, n):
+def sample_pagerank(corpus, damping_factor, n, walkers=1, workers=1, seed=None):
     """
     Return PageRank values for each page by sampling `n` pages
     according to transition model, starting with a page at random.
 
+    The `n` samples are shared between `walkers` independent surfers,
+    which are advanced together as NumPy arrays and split across
+    `workers` processes. Passing `seed` makes the result reproducible
+    for a given number of walkers and workers.
+
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
     """
 
-    page_rank = {page: 0 for page in corpus}
-    keys = list(corpus.keys())
-    r = random.randrange(0, len(keys))
-    random_page = keys[r]
-
-    for _ in range(n):
-        page_rank[random_page] += 1
-        sample = transition_model(corpus, random_page, damping_factor)
-
-        random_page = random.choices(list(sample.keys()), list(sample.values()))[0]
-
-    page_rank = {page: value / n for page, value in page_rank.items()}
+    graph = LinkGraph.from_corpus(corpus)
+    if walkers == 1 and workers == 1:
+        rng = random if seed is None else random.Random(seed)
+        visits = random_surf(graph, damping_factor, n, rng)
+    else:
+        visits = parallel_walk(graph, damping_factor, n, walkers, workers, seed)
+    return graph.to_dict(np.array(visits) / n)
+
+
+def adaptive_pagerank(
+    corpus,
+    damping_factor,
+    tolerance,
+    batch=SAMPLES,
+    max_samples=None,
+    walkers=100,
+    seed=None,
+):
+    """
+    Return PageRank values for each page by sampling in batches of about
+    `batch` pages until the standard error of every estimate is at most
+    `tolerance`, or until `max_samples` pages have been sampled.
+
+    Standard errors are estimated from the spread of the per-batch
+    estimates (batch means), so at least two batches are always drawn;
+    batches are shrunk so that two of them fit within `max_samples`.
+    Raise a ValueError if two batches of one step per walker do not fit.
+
+    Return a tuple `(ranks, errors, samples)` where `ranks` and `errors`
+    are dictionaries keyed by page name holding the PageRank estimate and
+    its standard error, and `samples` is the number of pages sampled.
+    """
+    batch_steps = max(1, -(-batch // walkers))
+    if max_samples is not None:
+        if max_samples < 2 * walkers:
+            raise ValueError(
+                f"max_samples must be at least two steps of {walkers} walkers"
+            )
+        batch_steps = min(batch_steps, max_samples // (2 * walkers))
+
+    graph = LinkGraph.from_corpus(corpus)
+    N = len(graph)
+    steps = walk(graph, damping_factor, walkers, np.random.default_rng(seed))
+    batch_samples = batch_steps * walkers
+
+    # Running mean and sum of squared deviations of the batch estimates
+    mean = np.zeros(N)
+    deviations = np.zeros(N)
+    batches = 0
+    while True:
+        visits = np.zeros(N, dtype=np.int64)
+        for _ in range(batch_steps):
+            np.add.at(visits, next(steps), 1)
+        estimate = visits / batch_samples
+
+        batches += 1
+        delta = estimate - mean
+        mean += delta / batches
+        deviations += delta * (estimate - mean)
+
+        samples = batches * batch_samples
+        if batches < 2:
+            continue
+        errors = np.sqrt(deviations / (batches - 1) / batches)
+        if errors.max() <= tolerance:
+            break
+        if max_samples is not None and samples + batch_samples > max_samples:
+            break
 
-    print(page_rank)
-    return page_rank
+    return graph.to_dict(mean), graph.to_dict(errors), samples
 
 
-def iterate_pagerank(corpus, damping_factor):
+def iterate_pagerank(corpus, damping_factor, **options):
     """
     Return PageRank values for each page by iteratively updating
-    PageRank values until convergence.
+    PageRank values until convergence. Keyword `options` such as the
+    solver `method` are passed on to `power_iterate`.
 
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
     """
-    N = len(corpus)
-    initial_rank = 1 / N
-    pageranks = {page: initial_rank for page in corpus}
+    graph = LinkGraph.from_corpus(corpus)
+    return graph.to_dict(power_iterate(graph, damping_factor, **options))
+
 
-    new_ranks = pageranks.copy()
+class LinkGraph:
+    """
+    Integer-indexed view of a corpus, used by the vectorized engines.
 
-    converged = False
-    while not converged:
-        converged = True
+    Pages are numbered in corpus order. Outgoing links are stored in
+    CSR layout: the pages linked to by page `i` are
+    `indices[indptr[i]:indptr[i + 1]]`, and `sources` repeats each
+    page index once per outgoing link so every edge is
+    `(sources[k], indices[k])`.
+    """
 
-        for page in corpus:
-            rank_sum = 0
-            for linking_page in corpus:
-                if corpus[linking_page]:
-                    if page in corpus[linking_page]:
-                        rank_sum += pageranks[linking_page] / len(corpus[linking_page])
+    def __init__(self, pages, indptr, indices):
+        self.pages = list(pages)
+        self.index = {page: i for i, page in enumerate(self.pages)}
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.out_degree = np.diff(self.indptr)
+        self.sources = np.repeat(
+            np.arange(len(self.pages), dtype=np.int32), self.out_degree
+        )
+        self.dangling = np.flatnonzero(self.out_degree == 0)
+        self._by_target = None
+
+    @classmethod
+    def from_corpus(cls, corpus):
+        """
+        Build a graph from a `crawl`-style dictionary mapping each page
+        to the set of pages it links to.
+        """
+        pages = list(corpus)
+        index = {page: i for i, page in enumerate(pages)}
+        indptr = np.zeros(len(pages) + 1, dtype=np.int64)
+        np.cumsum([len(corpus[page]) for page in pages], out=indptr[1:])
+        indices = np.fromiter(
+            (index[link] for page in pages for link in corpus[page]),
+            dtype=np.int32,
+            count=indptr[-1],
+        )
+        return cls(pages, indptr, indices)
+
+    def by_target(self):
+        """
+        Return the edges grouped by the page they link to, as a tuple
+        `(sources, targets, offsets)` where the links into page `i` are
+        `(sources[k], targets[k])` for `k` in `range(offsets[i], offsets[i + 1])`.
+        """
+        if self._by_target is None:
+            order = np.argsort(self.indices, kind="stable")
+            offsets = np.zeros(len(self.pages) + 1, dtype=np.int64)
+            np.cumsum(
+                np.bincount(self.indices, minlength=len(self.pages)), out=offsets[1:]
+            )
+            self._by_target = (self.sources[order], self.indices[order], offsets)
+        return self._by_target
+
+    def inbound(self, ranks):
+        """
+        Return the rank each page receives through links when every page
+        splits its entry in `ranks` evenly between the pages it links to.
+
+        `ranks` may also be a matrix with one rank vector per column, in
+        which case all columns are propagated together.
+        """
+        sources, _, offsets = self.by_target()
+        linked = np.flatnonzero(np.diff(offsets))
+        starts = offsets[linked]
+
+        degree = self.out_degree.reshape((-1,) + (1,) * (ranks.ndim - 1))
+        share = np.divide(ranks, degree, out=np.zeros(ranks.shape), where=degree > 0)
+        inbound = np.zeros(ranks.shape)
+        if len(linked):
+            inbound[linked] = np.add.reduceat(share[sources], starts, axis=0)
+        return inbound
+
+    def __len__(self):
+        return len(self.pages)
+
+    def propagate(self, ranks, damping_factor):
+        """
+        Return the ranks after one step of the random surfer model applied
+        to the rank vector `ranks`.
+
+        Pages without links are treated as linking to every page, so their
+        combined rank is spread evenly as a single scalar term.
+        """
+        N = len(self.pages)
+
+        # Each page splits its rank evenly between the pages it links to
+        share = np.zeros(N)
+        np.divide(ranks, self.out_degree, out=share, where=self.out_degree > 0)
+        inbound = np.bincount(self.indices, weights=share[self.sources], minlength=N)
+        dangling = ranks[self.dangling].sum()
+
+        return (1 - damping_factor) / N + damping_factor * (inbound + dangling / N)
+
+    def to_dict(self, values):
+        """
+        Return a dictionary mapping each page name to its entry in `values`.
+        """
+        return dict(zip(self.pages, values.tolist()))
+
+
+def power_iterate(
+    graph,
+    damping_factor,
+    threshold=THRESHOLD,
+    ranks=None,
+    method="jacobi",
+    norm="max",
+    callback=None,
+):
+    """
+    Return the PageRank vector of `graph` as a NumPy array, computed by
+    iterating until the ranks change by less than `threshold` between
+    iterations.
+
+    Iteration starts from `ranks` if given, which lets a previous
+    solution warm-start the computation, and from the uniform
+    distribution otherwise.
+
+    `method` selects how each iteration updates the ranks:
+        * "jacobi" applies the surfer model to the previous ranks,
+        * "gauss-seidel" updates blocks of pages in place, so later
+          blocks already see the new ranks of earlier ones. It
+          renormalizes after every sweep, and can need more sweeps than
+          Jacobi needs iterations, for example about twice as many on
+          graphs made of several disconnected components,
+        * "quadratic" is Jacobi with quadratic extrapolation from the
+          last four iterates every `EXTRAPOLATION_PERIOD` iterations, and
+        * "aitken" is the same with Aitken extrapolation from the last
+          three iterates, which is usually rejected, costing an extra
+          iteration each time.
+    An extrapolated vector is kept only if the iteration after it changes
+    the ranks less than the iteration before it did; otherwise iteration
+    resumes from the ranks before extrapolation.
+
+    `norm` is "max" to require that no page changes by `threshold` or
+    more, or "l1" to require that the total change is below `threshold`.
+    If given, `callback(iteration, residual, seconds)` is called after
+    every iteration with the change measured by `norm` and the wall time
+    elapsed since iteration started.
+    """
+    if method not in ("jacobi", "gauss-seidel", "quadratic", "aitken"):
+        raise ValueError(f"unknown method {method!r}")
+    if norm not in ("max", "l1"):
+        raise ValueError(f"unknown norm {norm!r}")
+
+    N = len(graph)
+    ranks = np.full(N, 1 / N) if ranks is None else ranks
+    history = []
+    fallback = None
+    start = time.perf_counter()
+    iteration = 0
+
+    while True:
+        iteration += 1
+        if method == "gauss-seidel":
+            new_ranks = gauss_seidel_sweep(graph, damping_factor, ranks)
+        else:
+            new_ranks = graph.propagate(ranks, damping_factor)
+
+        change = np.abs(new_ranks - ranks)
+        residual = change.max() if norm == "max" else change.sum()
+        if callback is not None:
+            callback(iteration, residual, time.perf_counter() - start)
+
+        ranks = new_ranks
+        if residual < threshold:
+            return ranks
+
+        # Undo an extrapolation that did not reduce the residual
+        if fallback is not None:
+            if residual >= fallback_residual:
+                ranks = fallback
+            fallback = None
+
+        if method in ("quadratic", "aitken"):
+            history = history[-3:] + [ranks]
+            if iteration % EXTRAPOLATION_PERIOD == 0 and len(history) == 4:
+                fallback, fallback_residual = ranks, residual
+                if method == "quadratic":
+                    ranks = quadratic_extrapolate(*history)
                 else:
-                    rank_sum += pageranks[linking_page] / N
+                    ranks = aitken_extrapolate(*history[1:])
+                history = []
+
+
+def gauss_seidel_sweep(graph, damping_factor, ranks, blocks=GAUSS_SEIDEL_BLOCKS):
+    """
+    Return the ranks after one Gauss-Seidel sweep over `graph`.
 
-            new_rank = (1 - damping_factor) / N + damping_factor * rank_sum
-            new_ranks[page] = new_rank
+    Pages are updated in `blocks` contiguous blocks. Each block is
+    computed from the newest ranks of every page, including those
+    updated earlier in the same sweep, which usually needs fewer sweeps
+    than Jacobi iteration while keeping each block vectorized.
+    """
+    N = len(graph)
+    ranks = ranks.copy()
+    sources, targets, offsets = graph.by_target()
+    degree = graph.out_degree
+    share = np.divide(ranks, degree, out=np.zeros(N), where=degree > 0)
+    dangling = ranks[graph.dangling].sum()
+
+    size = -(-N // blocks)
+    for low in range(0, N, size):
+        high = min(low + size, N)
+        edges = slice(offsets[low], offsets[high])
+        inbound = np.bincount(
+            targets[edges] - low, weights=share[sources[edges]], minlength=high - low
+        )
+        block = (1 - damping_factor) / N + damping_factor * (inbound + dangling / N)
+
+        # Keep the dangling total and shares in step with the new ranks
+        block_degree = degree[low:high]
+        dangling += (block - ranks[low:high])[block_degree == 0].sum()
+        np.divide(block, block_degree, out=share[low:high], where=block_degree > 0)
+        ranks[low:high] = block
+
+    # In-place updates do not conserve total rank, and the drift left in
+    # place would otherwise dominate the remaining error
+    return ranks / ranks.sum()
+
+
+def quadratic_extrapolate(first, second, third, fourth):
+    """
+    Return the quadratic extrapolation of four successive rank vectors.
+
+    Following Kamvar et al. (2003), the iterates are treated as mixing
+    the PageRank vector with the two slowest-decaying eigenvectors of the
+    surfer model, whose coefficients are fitted by least squares to the
+    last three changes and then cancelled. The result is renormalized to
+    sum to 1.
+    """
+    changes = np.stack([second - first, third - first], axis=1)
+    (g1, g2), *_ = np.linalg.lstsq(changes, first - fourth, rcond=None)
+    ranks = (g1 + g2 + 1) * second + (g2 + 1) * third + fourth
+    return ranks / ranks.sum()
 
-        for page in pageranks:
-            if abs(new_ranks[page] - pageranks[page]) >= 0.0001:
-                converged = False
 
-        pageranks = new_ranks.copy()
+def aitken_extrapolate(first, second, third):
+    """
+    Return the Aitken extrapolation of three successive rank vectors,
+    estimating the limit of each page's rank from its last two changes.
 
-    return pageranks
+    Pages whose changes are too small or erratic to extrapolate keep
+    their rank from `third`, and the result is renormalized to sum to 1.
+    """
+    curvature = third - 2 * second + first
+    with np.errstate(divide="ignore", invalid="ignore"):
+        limit = third - (third - second) ** 2 / curvature
+    ranks = np.where(
+        (np.abs(curvature) > 1e-15) & np.isfinite(limit) & (limit > 0), limit, third
+    )
+    return ranks / ranks.sum()
+
+
+class IterationLog:
+    """
+    Callback for `power_iterate` recording the residual and elapsed wall
+    time of every iteration.
+    """
+
+    def __init__(self):
+        self.residuals = []
+        self.seconds = []
+
+    def __call__(self, iteration, residual, seconds):
+        self.residuals.append(float(residual))
+        self.seconds.append(seconds)
+
+    @property
+    def iterations(self):
+        return len(self.residuals)
+
+
+def memmap_pagerank(prefix, damping_factor, threshold=THRESHOLD, block=EDGE_BLOCK):
+    """
+    Return PageRank values for each page of an on-disk edge list written
+    by `convert_corpus` or `save_edge_list`, computed by power iteration
+    until no page changes by `threshold` or more.
+
+    The edges are memory-mapped and streamed in blocks of `block` links,
+    so only the page names and a few rank vectors are held in memory.
+    """
+    with open(f"{prefix}.pages") as f:
+        pages = f.read().splitlines()
+    N = len(pages)
+    path = f"{prefix}.edges"
+
+    # An empty file cannot be memory-mapped, but simply has no edges
+    if os.path.getsize(path) == 0:
+        edges = np.empty((0, 2), dtype=EDGE_DTYPE)
+    else:
+        edges = np.memmap(path, dtype=EDGE_DTYPE, mode="r").reshape(-1, 2)
+
+    out_degree = np.zeros(N, dtype=np.int64)
+    for start in range(0, len(edges), block):
+        out_degree += np.bincount(edges[start : start + block, 0], minlength=N)
+    linked = out_degree > 0
+
+    ranks = np.full(N, 1 / N)
+    share = np.zeros(N)
+    while True:
+        np.divide(ranks, out_degree, out=share, where=linked)
+        inbound = np.zeros(N)
+        for start in range(0, len(edges), block):
+            chunk = np.asarray(edges[start : start + block])
+            inbound += np.bincount(chunk[:, 1], weights=share[chunk[:, 0]], minlength=N)
+        dangling = ranks[~linked].sum()
+
+        new_ranks = (1 - damping_factor) / N + damping_factor * (inbound + dangling / N)
+        converged = np.abs(new_ranks - ranks).max() < threshold
+        ranks = new_ranks
+        if converged:
+            return dict(zip(pages, ranks.tolist()))
+
+
+def update_pagerank(
+    corpus,
+    ranks,
+    damping_factor,
+    added_links=(),
+    removed_links=(),
+    removed_pages=(),
+    push=False,
+):
+    """
+    Return a tuple `(corpus, ranks)` with the corpus after applying a set
+    of edits, and the PageRank values of the edited corpus.
+
+    `ranks` holds the PageRank values of `corpus` before the edits, and is
+    used as the starting point so small edits converge in a few sweeps.
+    `added_links` and `removed_links` are iterables of `(page, link)`
+    pairs; pages that appear in `added_links` but not in the corpus are
+    added to it. If `push` is true, the previous ranks are refined by
+    local residual pushes instead of full power-iteration sweeps.
+    """
+    corpus = apply_link_diff(corpus, added_links, removed_links, removed_pages)
+    graph = LinkGraph.from_corpus(corpus)
+    N = len(graph)
+
+    # Pages new to the corpus start from the uniform rank
+    start = np.array([ranks.get(page, 1 / N) for page in graph.pages])
+    start /= start.sum()
+
+    if push:
+        new_ranks = push_pagerank(graph, damping_factor, start)
+    else:
+        new_ranks = power_iterate(graph, damping_factor, ranks=start)
+    return corpus, graph.to_dict(new_ranks)
+
+
+def apply_link_diff(corpus, added_links=(), removed_links=(), removed_pages=()):
+    """
+    Return a copy of `corpus` with `removed_pages` and every link to them
+    removed, the `(page, link)` pairs in `removed_links` removed, and the
+    pairs in `added_links` added.
+    """
+    removed_pages = set(removed_pages)
+    corpus = {
+        page: links - removed_pages
+        for page, links in corpus.items()
+        if page not in removed_pages
+    }
+    for page, link in removed_links:
+        if page in corpus:
+            corpus[page].discard(link)
+    for page, link in added_links:
+        corpus.setdefault(link, set())
+        if page != link:
+            corpus.setdefault(page, set()).add(link)
+    return corpus
+
+
+def push_pagerank(graph, damping_factor, ranks, threshold=THRESHOLD):
+    """
+    Return the PageRank vector of `graph` as a NumPy array, computed by
+    refining the approximate solution `ranks` with residual pushes.
+
+    The residual of each page is how far one step of the surfer model
+    would move its rank. Pushing a page adds its residual to its rank and
+    passes it on to the pages it links to, so only the neighbourhood of
+    an edit is revisited. Each round pushes, in NumPy, every page whose
+    residual is at least `threshold * (1 - damping_factor) / (2 * N)`,
+    and only the pages it touches are checked for the next round.
+
+    The L1 error of the ranks is at most the total residual divided by
+    `1 - damping_factor`, so pushing stops once the total residual is
+    below `threshold * (1 - damping_factor)`. Once a round would follow
+    more than `PUSH_FRACTION` of the links and pages, the edit is not
+    local, and warm power iteration finishes the job to the same bound.
+    """
+    N = len(graph)
+    residuals = graph.propagate(ranks, damping_factor) - ranks
+    ranks = ranks.copy()
+    target = threshold * (1 - damping_factor)
+    limit = target / (2 * N)
+    budget = PUSH_FRACTION * (len(graph.indices) + N)
+
+    # Share of a page's pushed residual passed along each of its links
+    scale = np.zeros(N)
+    np.divide(damping_factor, graph.out_degree, out=scale, where=graph.out_degree > 0)
+
+    # Residual pushed from pages without links is owed to every page, so
+    # it is pooled and only spread once it could matter
+    pooled = 0.0
+    total = np.abs(residuals).sum()
+    frontier = np.flatnonzero(np.abs(residuals) >= limit)
+
+    while total + N * abs(pooled) >= target:
+        if not len(frontier):
+            residuals += pooled
+            pooled = 0.0
+            total = np.abs(residuals).sum()
+            frontier = np.flatnonzero(np.abs(residuals) >= limit)
+            continue
+
+        counts = graph.out_degree[frontier]
+        if counts.sum() + len(frontier) > budget:
+            ranks = ranks + residuals + pooled
+            return power_iterate(
+                graph, damping_factor, target, ranks=ranks / ranks.sum(), norm="l1"
+            )
+
+        pushed = residuals[frontier]
+        ranks[frontier] += pushed
+        residuals[frontier] = 0.0
+        total -= np.abs(pushed).sum()
+        pooled += damping_factor * pushed[counts == 0].sum() / N
+
+        # Gather the links of every page in the frontier from the CSR rows
+        offsets = np.cumsum(counts) - counts
+        edges = np.repeat(graph.indptr[frontier] - offsets, counts) + np.arange(
+            counts.sum()
+        )
+        links = graph.indices[edges]
+        touched = np.unique(links)
+        total -= np.abs(residuals[touched]).sum()
+        np.add.at(residuals, links, np.repeat(pushed * scale[frontier], counts))
+        total += np.abs(residuals[touched]).sum()
+        frontier = touched[np.abs(residuals[touched]) >= limit]
+
+    # The remaining residual is not rank, so drop it and renormalize
+    return ranks / ranks.sum()
+
+
+def personalized_pagerank(graph, seeds, damping_factor, threshold=THRESHOLD):
+    """
+    Return a list with the personalized PageRank values of `graph` for
+    each entry of `seeds`, as dictionaries keyed by page name.
+
+    Each seed is a page name, a collection of page names to teleport to
+    uniformly, or a dictionary mapping page names to teleport weights.
+    The surfer teleports (and leaves pages without links) according to
+    the seed instead of uniformly. All seeds are solved together by
+    iterating a matrix with one rank vector per column until no entry
+    changes by `threshold` or more.
+    """
+    teleport = np.zeros((len(graph), len(seeds)))
+    for column, seed in enumerate(seeds):
+        if isinstance(seed, str):
+            seed = [seed]
+        if not isinstance(seed, dict):
+            seed = dict.fromkeys(seed, 1)
+        for page, weight in seed.items():
+            teleport[graph.index[page], column] = weight
+    teleport /= teleport.sum(axis=0)
+
+    ranks = teleport
+    while True:
+        dangling = ranks[graph.dangling].sum(axis=0)
+        new_ranks = (1 - damping_factor) * teleport + damping_factor * (
+            graph.inbound(ranks) + teleport * dangling
+        )
+        converged = np.abs(new_ranks - ranks).max() < threshold
+        ranks = new_ranks
+        if converged:
+            break
+
+    return [graph.to_dict(ranks[:, column]) for column in range(len(seeds))]
+
+
+def push_personalized(graph, seed, damping_factor, epsilon=1e-6):
+    """
+    Return approximate personalized PageRank values for teleporting to
+    the page `seed`, as a dictionary holding only the pages reached.
+
+    Uses forward push: residual probability starts at the seed, and any
+    page holding at least `epsilon` residual per outgoing link keeps
+    `1 - damping_factor` of it and passes the rest along its links (or
+    back to the seed, if it has none). The work depends on `epsilon` and
+    the seed's neighbourhood rather than on the size of the graph.
+    """
+    indptr = graph.indptr
+    indices = graph.indices
+    source = graph.index[seed]
+
+    estimates = dict()
+    residuals = {source: 1.0}
+    queue = deque([source])
+    queued = {source}
+    while queue:
+        page = queue.popleft()
+        queued.discard(page)
+        residual = residuals.pop(page)
+        estimates[page] = estimates.get(page, 0) + (1 - damping_factor) * residual
+
+        start, end = indptr[page], indptr[page + 1]
+        links = indices[start:end].tolist() if end > start else [source]
+        share = damping_factor * residual / len(links)
+        for link in links:
+            residuals[link] = residuals.get(link, 0) + share
+            degree = max(1, indptr[link + 1] - indptr[link])
+            if link not in queued and residuals[link] >= epsilon * degree:
+                queue.append(link)
+                queued.add(link)
+
+    return {graph.pages[page]: value for page, value in estimates.items()}
+
+
+def random_surf(graph, damping_factor, n, rng=random):
+    """
+    Follow a single random surfer around `graph` for `n` steps, starting
+    at a random page, and return a list counting the visits to each page.
+
+    Each step follows the transition model without building it: with
+    probability `damping_factor` the surfer follows one of the current
+    page's links, chosen uniformly, and otherwise (or always, if the
+    page has no links) jumps to a page chosen uniformly from the graph.
+    Either case is a single draw, so each step is O(1).
+    """
+    N = len(graph)
+    indptr = graph.indptr.tolist()
+    indices = graph.indices.tolist()
+    visits = [0] * N
+
+    page = rng.randrange(N)
+    for _ in range(n):
+        visits[page] += 1
+        start = indptr[page]
+        links = indptr[page + 1] - start
+        if links and rng.random() < damping_factor:
+            page = indices[start + rng.randrange(links)]
+        else:
+            page = rng.randrange(N)
+
+    return visits
+
+
+def walk(graph, damping_factor, walkers, rng, burn_in=None):
+    """
+    Generate the pages occupied by `walkers` independent random surfers,
+    as an array of page indices, after each step of the transition model.
+
+    Surfers start at pages chosen uniformly at random using the NumPy
+    generator `rng`, and take `burn_in` steps before their pages are
+    first generated. By default this is `burn_in_steps(damping_factor)`,
+    so that short walks are not biased towards the uniform start.
+    """
+    N = len(graph)
+    if burn_in is None:
+        burn_in = burn_in_steps(damping_factor)
+    positions = rng.integers(N, size=walkers)
+    step = 0
+    while True:
+        if step >= burn_in:
+            yield positions
+        step += 1
+
+        # Surfers that do not follow a link jump to a random page
+        degree = graph.out_degree[positions]
+        follow = (degree > 0) & (rng.random(walkers) < damping_factor)
+        followers = np.flatnonzero(follow)
+        links = graph.indptr[positions[followers]] + rng.integers(degree[followers])
+
+        positions = rng.integers(N, size=walkers)
+        positions[followers] = graph.indices[links]
+
+
+def burn_in_steps(damping_factor, tolerance=BURN_IN_TOLERANCE):
+    """
+    Return how many steps a surfer must take, from any starting page,
+    before the distribution of its page is within `tolerance` of PageRank
+    in total variation distance.
+
+    Each step teleports with probability at least `1 - damping_factor`,
+    so the distance shrinks by at least a factor of `damping_factor`.
+    """
+    if not 0 < damping_factor < 1:
+        return 0
+    return math.ceil(math.log(tolerance) / math.log(damping_factor))
+
+
+def count_visits(graph, damping_factor, n, walkers, rng):
+    """
+    Return an array counting the visits to each page made by `walkers`
+    surfers advanced together until `n` pages have been sampled.
+    """
+    visits = np.zeros(len(graph), dtype=np.int64)
+    remaining = n
+    for positions in walk(graph, damping_factor, walkers, rng):
+        if remaining <= 0:
+            break
+        positions = positions[:remaining]
+        np.add.at(visits, positions, 1)
+        remaining -= len(positions)
+    return visits
+
+
+def parallel_walk(graph, damping_factor, n, walkers, workers, seed=None):
+    """
+    Return an array of visit counts from `n` samples, with the samples and
+    the `walkers` split as evenly as possible between `workers` processes.
+
+    Each process draws from its own stream spawned from `seed`, so the
+    merged counts are reproducible for a fixed number of workers.
+    """
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    shards = [
+        (
+            graph,
+            damping_factor,
+            n // workers + (i < n % workers),
+            max(1, walkers // workers + (i < walkers % workers)),
+            np.random.default_rng(seeds[i]),
+        )
+        for i in range(workers)
+    ]
+    if workers == 1:
+        return count_visits(*shards[0])
+    with multiprocessing.Pool(workers) as pool:
+        return sum(pool.starmap(count_visits, shards))
 
 
 if __name__ == "__main__":